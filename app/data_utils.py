@@ -1,19 +1,46 @@
 import os
+import time
 import torch
+import logging
 import numpy as np
-from torch.utils.data import Dataset
+import soundfile as sf
+from torch.utils.data import DataLoader, Dataset, Sampler
 import random
-from typing import Dict, List, Iterator
+from typing import Dict, List, Iterable, Iterator, Optional
 import librosa
-from config import AUDIO_SAMPLE_RATE
+from config import AUDIO_SAMPLE_RATE, DATA_LOADER_CONFIG, FEATURE_STORE_CONFIG, SPECTRAL_CONFIG
+from .feature_store import PackedFeatureStore, convert_segment_dirs
+from .spectral import spectrogram
+
+logger = logging.getLogger(__name__)
 
 class SVCDataset(Dataset):
-    """SVC数据集"""
-    def __init__(self, root_dir: str, segment_size: int = 8192):
+    """SVC数据集
+    
+    音频以预先解码的int16读取: 打包特征按内存映射访问, 未打包时在初始化时打包一次;
+    ram_cache_mb>0时把打包特征读入共享内存, 多个DataLoader worker共用。
+    只用于进程内读取(get_batch); SVCTrainer.train_model运行外部so-vits-svc的train.py,
+    其数据加载不经过本模块。
+    """
+    def __init__(self, root_dir: str, segment_size: int = 8192,
+                 ram_cache_mb: Optional[int] = None):
         self.root_dir = root_dir
         self.segment_size = segment_size
         self.metadata = self._load_metadata()
         
+        # 有打包特征时以内存映射读取, 否则逐个读取片段目录中的文件
+        store_dir = os.path.join(root_dir, FEATURE_STORE_CONFIG['dir_name'])
+        if FEATURE_STORE_CONFIG['pack'] and not PackedFeatureStore.exists(store_dir):
+            convert_segment_dirs(root_dir, store_dir)
+        self.store = PackedFeatureStore(store_dir) if PackedFeatureStore.exists(store_dir) else None
+        
+        self.lengths = self._load_lengths()
+        
+        ram_cache_mb = DATA_LOADER_CONFIG['ram_cache_mb'] if ram_cache_mb is None else ram_cache_mb
+        if self.store is not None and ram_cache_mb > 0:
+            loaded = self.store.load_into_memory(ram_cache_mb * 1024 * 1024)
+            logger.info(f"Loaded {loaded / 1024 / 1024:.1f}MB of packed features into shared memory")
+        
     def _load_metadata(self) -> List[Dict]:
         """加载元数据"""
         metadata = []
@@ -25,12 +52,22 @@ class SVCDataset(Dataset):
                 
                 # 加载特征文件路径
                 metadata.append({
+                    'name': segment_dir,
                     'audio_path': os.path.join(self.root_dir, path),
                     'mel_path': os.path.join(self.root_dir, segment_dir, 'mel.npy'),
                     'f0_path': os.path.join(self.root_dir, segment_dir, 'f0.npy')
                 })
         return metadata
         
+    def _load_lengths(self) -> List[int]:
+        """各项裁剪后的帧数, 用于按长度分桶"""
+        if self.store is not None:
+            samples = self.store.audio_lengths()
+            samples = [int(samples[self.store.position(item['name'])]) for item in self.metadata]
+        else:
+            samples = [sf.info(item['audio_path']).frames for item in self.metadata]
+        return [min(n, self.segment_size) // SPECTRAL_CONFIG['hop_length'] for n in samples]
+        
     def __len__(self):
         return len(self.metadata)
         
@@ -39,48 +76,215 @@ class SVCDataset(Dataset):
         item = self.metadata[idx]
         
         # 加载音频和特征
-        audio, _ = librosa.load(item['audio_path'], sr=AUDIO_SAMPLE_RATE)
-        mel = np.load(item['mel_path'])
-        f0 = np.load(item['f0_path'])
+        if self.store is not None:
+            data = self.store[self.store.position(item['name'])]
+            audio, mel, f0 = data['audio'], data['mel'], data['f0']
+        else:
+            audio, sr = sf.read(item['audio_path'], dtype='int16')
+            if sr != AUDIO_SAMPLE_RATE:
+                audio = librosa.resample(audio / 32768, orig_sr=sr, target_sr=AUDIO_SAMPLE_RATE)
+            mel = np.load(item['mel_path'])
+            f0 = np.load(item['f0_path'])
         
         # 随机裁剪
+        spec_audio = audio
         if len(audio) > self.segment_size:
             start = random.randint(0, len(audio) - self.segment_size)
             end = start + self.segment_size
             
+            hop_length = SPECTRAL_CONFIG['hop_length']
+            # 不居中分帧时mel末帧延伸到n_fft - hop_length之后, 线性谱多取这部分音频以保持帧对齐
+            spec_audio = audio[start:end + SPECTRAL_CONFIG['n_fft'] - hop_length]
             audio = audio[start:end]
-            mel = mel[:, start//512:end//512]
-            f0 = f0[start//512:end//512]
+            mel = mel[:, start//hop_length:end//hop_length]
+            f0 = f0[start//hop_length:end//hop_length]
             
-        # 转换为tensor
-        audio = torch.FloatTensor(audio)
-        mel = torch.FloatTensor(mel)
-        f0 = torch.FloatTensor(f0)
+        # 转换为tensor(内存映射的数据在裁剪后才复制)
+        audio = _to_float_tensor(audio)
+        mel = torch.from_numpy(np.asarray(mel, dtype=np.float32))
+        f0 = torch.from_numpy(np.asarray(f0, dtype=np.float32))
+        
+        # 线性幅度谱, 帧与mel对齐
+        spec = spectrogram(_to_float_tensor(spec_audio), power=1.0)
+        frames = min(spec.shape[1], mel.shape[1])
+        spec, mel = spec[:, :frames], mel[:, :frames]
         
         return {
             'audio': audio,
+            'spec': spec,
             'mel': mel,
             'f0': f0,
             'path': item['audio_path']
         }
         
-    def get_batch(self, batch_size: int) -> Iterator[Dict[str, torch.Tensor]]:
-        """获取批次数据"""
-        indices = list(range(len(self)))
-        random.shuffle(indices)
+    def get_batch(self, batch_size: int,
+                  max_frames: Optional[int] = None) -> Iterator[Dict[str, torch.Tensor]]:
+        """获取批次数据, 指定max_frames时按长度分桶动态组批"""
+        max_frames = max_frames or DATA_LOADER_CONFIG['max_batch_frames']
+        if max_frames:
+            yield from create_dataloader(self, collate_fn=collate_batch,
+                                         batch_sampler=BucketBatchSampler(self.lengths, max_frames))
+        else:
+            yield from create_dataloader(self, batch_size, collate_fn=collate_batch)
+
+def _to_float_tensor(audio) -> torch.Tensor:
+    if audio.dtype == np.int16:
+        audio = audio.astype(np.float32) / 32768
+    return torch.from_numpy(np.asarray(audio, dtype=np.float32))
+
+def _pad_last(tensors: List[torch.Tensor]):
+    """沿最后一维补零到批次内最大长度, 返回(批次张量, 长度)"""
+    lengths = torch.tensor([t.shape[-1] for t in tensors], dtype=torch.long)
+    padded = tensors[0].new_zeros((len(tensors),) + tuple(tensors[0].shape[:-1]) + (int(lengths.max()),))
+    for i, t in enumerate(tensors):
+        padded[i, ..., :t.shape[-1]] = t
+    return padded, lengths
+
+def collate_batch(batch: List[Dict]) -> Dict:
+    """合并批次: 各项补零到批次内最大长度, 同时返回每项的实际长度"""
+    merged = {}
+    for key in ('audio', 'spec', 'mel', 'f0'):
+        merged[key], merged[f'{key}_lengths'] = _pad_last([item[key] for item in batch])
+    merged['paths'] = [item['path'] for item in batch]
+    return merged
+
+class BucketBatchSampler(Sampler):
+    """按长度分桶的动态批次采样器
+    
+    每个epoch打乱后按pool_size分池, 池内按长度排序后依次装批,
+    直到(批内最长项帧数 × 项数)超过max_frames; 批次顺序再打乱。
+    单项超过max_frames时独占一批。padding_stats()返回最近一个epoch的补零比例。
+    """
+    def __init__(self, lengths: List[int], max_frames: int,
+                 pool_size: Optional[int] = None,
+                 shuffle: bool = True,
+                 seed: int = 0):
+        self.lengths = np.asarray(lengths, dtype=np.int64)
+        self.max_frames = max_frames
+        self.pool_size = pool_size or DATA_LOADER_CONFIG['bucket_pool_size']
+        self.shuffle = shuffle
+        self.seed = seed
+        self.epoch = 0
+        self._cache = None  # (epoch, batches)
+        self._stats = {}
         
-        for i in range(0, len(self), batch_size):
-            batch_indices = indices[i:i + batch_size]
-            batch = [self[idx] for idx in batch_indices]
+    def _batches(self, epoch: int) -> List[List[int]]:
+        if self._cache is not None and self._cache[0] == epoch:
+            return self._cache[1]
             
-            # 合并批次
-            audio = torch.stack([item['audio'] for item in batch])
-            mel = torch.stack([item['mel'] for item in batch])
-            f0 = torch.stack([item['f0'] for item in batch])
+        rng = np.random.default_rng(self.seed + epoch)
+        order = rng.permutation(len(self.lengths)) if self.shuffle else np.arange(len(self.lengths))
+        batches = []
+        for start in range(0, len(order), self.pool_size):
+            pool = order[start:start + self.pool_size]
+            pool = pool[np.argsort(self.lengths[pool], kind='stable')]
+            batch, longest = [], 0
+            for idx in pool:
+                length = max(1, int(self.lengths[idx]))
+                if batch and max(longest, length) * (len(batch) + 1) > self.max_frames:
+                    batches.append(batch)
+                    batch, longest = [], 0
+                batch.append(int(idx))
+                longest = max(longest, length)
+            if batch:
+                batches.append(batch)
+        if self.shuffle:
+            batches = [batches[i] for i in rng.permutation(len(batches))]
             
-            yield {
-                'audio': audio,
-                'mel': mel,
-                'f0': f0,
-                'paths': [item['path'] for item in batch]
-            } 
\ No newline at end of file
+        self._cache = (epoch, batches)
+        return batches
+        
+    def __iter__(self):
+        batches = self._batches(self.epoch)
+        frames = sum(int(self.lengths[b].sum()) for b in batches)
+        padded = sum(int(self.lengths[b].max()) * len(b) for b in batches if b)
+        self._stats = {
+            'epoch': self.epoch,
+            'batches': len(batches),
+            'frames': frames,
+            'padded_frames': padded,
+            'waste': round(1 - frames / padded, 4) if padded else 0.0
+        }
+        self.epoch += 1
+        yield from batches
+        
+    def __len__(self):
+        return len(self._batches(self.epoch))
+        
+    def padding_stats(self) -> Dict:
+        """最近一个epoch的批次数、实际帧数、补零后帧数和补零比例"""
+        return dict(self._stats)
+
+def dataset_lengths(dataset: Dataset, hop_length: Optional[int] = None) -> Optional[List[int]]:
+    """数据集各项的帧数, 供分桶采样使用
+    
+    优先用dataset.lengths; so-vits-svc的TextAudioSpeakerLoader没有该属性,
+    按其audiopaths中的音频长度估算; 都没有时返回None。
+    """
+    lengths = getattr(dataset, 'lengths', None)
+    if lengths is not None:
+        return list(lengths)
+    audiopaths = getattr(dataset, 'audiopaths', None)
+    if audiopaths is None:
+        return None
+    hop_length = hop_length or SPECTRAL_CONFIG['hop_length']
+    paths = [item[0] if isinstance(item, (list, tuple)) else item for item in audiopaths]
+    try:
+        return [sf.info(path).frames // hop_length for path in paths]
+    except Exception as e:
+        logger.warning(f"Failed to read item lengths: {str(e)}")
+        return None
+
+def create_dataloader(dataset: Dataset, batch_size: int = 1, shuffle: bool = True,
+                      collate_fn=None, **kwargs) -> DataLoader:
+    """创建多进程DataLoader: 常驻worker、预取, GPU训练时锁页内存; kwargs覆盖默认参数
+    
+    训练中仅进程内训练器(SVCTrainer._train_svc_model)使用, 外部train.py不受影响。
+    """
+    num_workers = kwargs.pop('num_workers', DATA_LOADER_CONFIG['num_workers'])
+    options = {'num_workers': num_workers, 'pin_memory': torch.cuda.is_available()}
+    if num_workers > 0:
+        options['persistent_workers'] = True
+        options['prefetch_factor'] = DATA_LOADER_CONFIG['prefetch_factor']
+    options.update(kwargs)
+    if 'batch_sampler' in options:
+        return DataLoader(dataset, collate_fn=collate_fn, **options)
+    return DataLoader(dataset, batch_size=batch_size, shuffle=shuffle,
+                      collate_fn=collate_fn, **options)
+
+class DataWaitMeter:
+    """统计训练循环每步等待数据的时间"""
+    def __init__(self):
+        self.reset()
+        
+    def reset(self):
+        self.steps = 0
+        self.wait_seconds = 0.0
+        self.max_wait = 0.0
+        self._start = time.perf_counter()
+        
+    def wrap(self, loader: Iterable) -> Iterator:
+        """迭代loader, 记录每次取批次的耗时"""
+        iterator = iter(loader)
+        while True:
+            start = time.perf_counter()
+            try:
+                batch = next(iterator)
+            except StopIteration:
+                return
+            wait = time.perf_counter() - start
+            self.steps += 1
+            self.wait_seconds += wait
+            self.max_wait = max(self.max_wait, wait)
+            yield batch
+            
+    def summary(self) -> Dict[str, float]:
+        """步数、等待总时长、平均/最大单步等待(ms)和等待占比"""
+        elapsed = time.perf_counter() - self._start
+        return {
+            'steps': self.steps,
+            'wait_seconds': round(self.wait_seconds, 3),
+            'mean_wait_ms': round(self.wait_seconds / self.steps * 1000, 2) if self.steps else 0.0,
+            'max_wait_ms': round(self.max_wait * 1000, 2),
+            'wait_fraction': round(self.wait_seconds / elapsed, 4) if elapsed else 0.0
+        }
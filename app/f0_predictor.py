@@ -1,10 +1,138 @@
+import math
 import numpy as np
 import torch
 import pyworld
 import parselmouth
 import librosa
+import multiprocessing
+from fractions import Fraction
+from concurrent.futures import ProcessPoolExecutor
 from typing import Optional, List, Union, Tuple
-from config import SVC_INFERENCE_CONFIG
+from config import SVC_INFERENCE_CONFIG, F0_PARALLEL_CONFIG, HUBERT_CONFIG
+
+def _world_f0(audio: np.ndarray, sample_rate: int,
+              frame_period: float, method: str) -> np.ndarray:
+    """WORLD算法提取F0(dio+stonemask或harvest)"""
+    x = audio.astype(np.double)
+    if method == 'dio':
+        f0, t = pyworld.dio(
+            x,
+            fs=sample_rate,
+            f0_floor=50.0,
+            f0_ceil=1100.0,
+            frame_period=frame_period
+        )
+        return pyworld.stonemask(x, f0, t, sample_rate)
+    elif method == 'harvest':
+        f0, t = pyworld.harvest(
+            x,
+            fs=sample_rate,
+            f0_floor=50.0,
+            f0_ceil=1100.0,
+            frame_period=frame_period
+        )
+        return f0
+    raise ValueError(f"Unsupported F0 method: {method}")
+
+def _f0_chunk_worker(args: Tuple[np.ndarray, int, float, str]) -> np.ndarray:
+    """进程池中提取单个分块的F0"""
+    return _world_f0(*args)
+
+def should_chunk_f0(n_samples: int, sample_rate: int) -> bool:
+    """判断音频是否需要分块并行提取F0
+
+    守护进程(如Celery prefork的子进程)不能创建进程池, 分块只会增加开销, 始终整段提取。
+    """
+    return (F0_PARALLEL_CONFIG['enabled']
+            and F0_PARALLEL_CONFIG['num_workers'] > 1
+            and not multiprocessing.current_process().daemon
+            and n_samples >= F0_PARALLEL_CONFIG['min_duration'] * sample_rate)
+
+def compute_f0_chunked(audio: np.ndarray,
+                       sample_rate: int,
+                       hop_length: Union[int, float],
+                       method: str = 'harvest',
+                       num_workers: Optional[int] = None,
+                       chunk_seconds: Optional[float] = None,
+                       overlap_seconds: Optional[float] = None) -> np.ndarray:
+    """分块并行提取F0
+
+    每块两侧各带overlap_seconds的上下文, 块起点对齐到整数采样点的帧边界,
+    只保留块中心部分的帧按顺序拼接, 帧数与整段提取一致。
+    """
+    num_workers = num_workers or F0_PARALLEL_CONFIG['num_workers']
+    if chunk_seconds is None:
+        chunk_seconds = F0_PARALLEL_CONFIG['chunk_seconds']
+    if overlap_seconds is None:
+        overlap_seconds = F0_PARALLEL_CONFIG['overlap_seconds']
+
+    # 帧移可以是非整数采样点(如5ms@44.1kHz=220.5), 取能落在整数采样点上的最小帧数作为对齐单位
+    hop = Fraction(hop_length).limit_denominator(1000)
+    unit = hop.denominator
+    frame_period = 1000 * float(hop) / sample_rate
+
+    # 与pyworld内部的帧数计算方式保持一致
+    n_frames = int(1000.0 * len(audio) / sample_rate / frame_period) + 1
+
+    frames_per_second = sample_rate / float(hop)
+    chunk_frames = max(unit, int(chunk_seconds * frames_per_second) // unit * unit)
+    margin_frames = int(math.ceil(overlap_seconds * frames_per_second / unit)) * unit
+
+    # 切分任务
+    jobs = []
+    spans = []
+    for start in range(0, n_frames, chunk_frames):
+        stop = min(start + chunk_frames, n_frames)
+        lo = max(0, start - margin_frames)
+        hi = min(n_frames, stop + margin_frames)
+        begin = int(lo * hop)
+        end = min(len(audio), int(math.ceil(hi * hop)))
+        jobs.append((audio[begin:end], sample_rate, frame_period, method))
+        spans.append((start - lo, stop - lo))
+
+    # 提取F0(map保证结果顺序与分块顺序一致), 守护进程中不能创建进程池, 串行提取
+    if num_workers <= 1 or len(jobs) == 1 or multiprocessing.current_process().daemon:
+        results = [_f0_chunk_worker(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=min(num_workers, len(jobs))) as executor:
+            results = list(executor.map(_f0_chunk_worker, jobs))
+
+    # 拼接
+    f0 = np.zeros(n_frames, dtype=np.double)
+    offset = 0
+    for chunk_f0, (a, b) in zip(results, spans):
+        piece = chunk_f0[a:b]
+        f0[offset:offset + len(piece)] = piece
+        offset += b - a
+    return f0
+
+def interpolate_unvoiced(f0: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """对清音帧(f0=0)做线性插值, 返回连续F0和浊音标记"""
+    f0 = np.asarray(f0, dtype=np.double)
+    vuv = (f0 > 0).astype(np.float32)
+    voiced = np.nonzero(vuv)[0]
+    if len(voiced) == 0:
+        return np.zeros_like(f0), vuv
+    # 两端用最近的浊音帧填充
+    f0 = np.interp(np.arange(len(f0)), voiced, f0[voiced])
+    return f0, vuv
+
+def align_f0(f0: np.ndarray,
+             times: np.ndarray,
+             n_frames: int,
+             hop_seconds: float) -> Tuple[np.ndarray, np.ndarray]:
+    """将任意后端的F0重采样到目标帧网格(第i帧位于i*hop_seconds)
+
+    先插值清音段得到连续曲线再重采样, 浊音标记按相邻帧插值后取阈值0.5。
+    """
+    target_times = np.arange(n_frames) * hop_seconds
+    if len(f0) == 0:
+        return np.zeros(n_frames), np.zeros(n_frames, dtype=np.float32)
+
+    f0, vuv = interpolate_unvoiced(f0)
+    aligned = np.interp(target_times, times, f0)
+    aligned_vuv = (np.interp(target_times, times, vuv) >= 0.5).astype(np.float32)
+    return aligned, aligned_vuv
 
 class F0Predictor:
     """F0预测器"""
@@ -29,29 +157,36 @@ class F0Predictor:
             
     def _dio(self, audio: np.ndarray) -> np.ndarray:
         """DIO算法"""
-        f0, t = pyworld.dio(
-            audio.astype(np.double),
-            fs=self.sample_rate,
-            f0_floor=50.0,
-            f0_ceil=1100.0,
-            frame_period=1000 * self.hop_length / self.sample_rate
+        if should_chunk_f0(len(audio), self.sample_rate):
+            return compute_f0_chunked(audio, self.sample_rate, self.hop_length, method='dio')
+        return _world_f0(
+            audio,
+            self.sample_rate,
+            1000 * self.hop_length / self.sample_rate,
+            'dio'
         )
-        f0 = pyworld.stonemask(audio.astype(np.double), f0, t, self.sample_rate)
-        return f0
         
     def _harvest(self, audio: np.ndarray) -> np.ndarray:
         """Harvest算法"""
-        f0, t = pyworld.harvest(
-            audio.astype(np.double),
-            fs=self.sample_rate,
-            f0_floor=50.0,
-            f0_ceil=1100.0,
-            frame_period=1000 * self.hop_length / self.sample_rate
+        if should_chunk_f0(len(audio), self.sample_rate):
+            return compute_f0_chunked(audio, self.sample_rate, self.hop_length, method='harvest')
+        return _world_f0(
+            audio,
+            self.sample_rate,
+            1000 * self.hop_length / self.sample_rate,
+            'harvest'
         )
-        return f0
         
     def _parselmouth(self, audio: np.ndarray) -> np.ndarray:
         """Parselmouth算法"""
+        f0, times = self._parselmouth_raw(audio)
+        # 对齐到dio/harvest的帧网格
+        n_frames = len(audio) // self.hop_length + 1
+        aligned, vuv = align_f0(f0, times, n_frames, self.hop_length / self.sample_rate)
+        return aligned * vuv
+        
+    def _parselmouth_raw(self, audio: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Parselmouth原始输出(F0与帧中心时间)"""
         sound = parselmouth.Sound(audio, self.sample_rate)
         pitch = sound.to_pitch_ac(
             time_step=self.hop_length / self.sample_rate,
@@ -59,11 +194,29 @@ class F0Predictor:
             pitch_floor=50.0,
             pitch_ceiling=1100.0
         )
-        pitch_values = np.array([
-            pitch.get_value_at_time(t) if pitch.get_value_at_time(t) is not None
-            else 0.0 for t in pitch.xs()
-        ])
-        return pitch_values
+        # 一次读取整条曲线, 清音帧为0
+        return pitch.selected_array['frequency'], pitch.xs()
+        
+    def frame_times(self, n_frames: int) -> np.ndarray:
+        """compute_f0输出帧对应的时间(秒)"""
+        return np.arange(n_frames) * self.hop_length / self.sample_rate
+        
+    def compute_aligned_f0(self, audio: np.ndarray,
+                           n_frames: int,
+                           hop_seconds: Optional[float] = None,
+                           pitch_shift: float = 0) -> Tuple[np.ndarray, np.ndarray]:
+        """计算F0并对齐到内容特征帧网格(默认HuBERT帧移)"""
+        if hop_seconds is None:
+            hop_seconds = HUBERT_CONFIG['hop_length'] / HUBERT_CONFIG['sample_rate']
+        if self.method == 'parselmouth':
+            f0, times = self._parselmouth_raw(audio)
+        else:
+            f0 = self.compute_f0(audio)
+            times = self.frame_times(len(f0))
+        f0, vuv = align_f0(f0, times, n_frames, hop_seconds)
+        if pitch_shift != 0:
+            f0 = f0 * 2 ** (pitch_shift / 12)  # 半音转换
+        return f0, vuv
                         
     def compute_f0_with_pitch_shift(self, audio: np.ndarray, pitch_shift: float = 0) -> np.ndarray:
         """计算带音高偏移的F0"""
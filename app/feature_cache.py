@@ -0,0 +1,165 @@
+import os
+import hashlib
+import logging
+import threading
+import numpy as np
+from typing import Callable, Optional, Union
+from config import FEATURE_CACHE_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# 超限时淘汰到上限的这一比例, 留出余量避免之后每次写入都重新扫描
+EVICT_TARGET_RATIO = 0.9
+
+class FeatureCache:
+    """内容特征缓存
+
+    以(音频哈希, 编码器名称, 输出层)为键, 特征以fp16 .npy文件保存在磁盘上,
+    读取时内存映射; 总大小超过上限时按最近访问时间淘汰。
+    总大小在首次写入时扫描目录得到, 之后随写入和淘汰累计; 累计值超过上限时才重新扫描
+    (多进程共用目录时各进程只累计自己的写入, 重新扫描时校正)。
+    """
+    def __init__(self, cache_dir: Optional[str] = None,
+                 max_size_mb: Optional[int] = None):
+        self.cache_dir = cache_dir or FEATURE_CACHE_CONFIG['cache_dir']
+        self.max_bytes = (max_size_mb or FEATURE_CACHE_CONFIG['max_size_mb']) * 1024 * 1024
+        self.enabled = FEATURE_CACHE_CONFIG['enabled']
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._size = None  # 目录总字节数, None表示尚未扫描
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def audio_hash(audio: Union[np.ndarray, 'torch.Tensor']) -> str:
+        """计算音频内容哈希"""
+        if hasattr(audio, 'detach'):
+            audio = audio.detach().cpu().numpy()
+        data = np.ascontiguousarray(audio, dtype=np.float32)
+        digest = hashlib.sha1(data.tobytes())
+        digest.update(str(data.shape).encode())
+        return digest.hexdigest()
+
+    def make_key(self, audio_hash: str, encoder: str, layer: Optional[int] = None) -> str:
+        """生成缓存键"""
+        raw = f"{audio_hash}:{encoder}:{layer if layer is not None else 'final'}"
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.npy")
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """读取缓存(内存映射, 只读)"""
+        path = self._path(key)
+        try:
+            features = np.load(path, mmap_mode='r')
+            os.utime(path)  # 更新访问时间用于LRU淘汰
+            return features
+        except (FileNotFoundError, ValueError, OSError):
+            return None
+
+    def put(self, key: str, features: np.ndarray) -> np.ndarray:
+        """写入缓存, 返回内存映射的fp16特征"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # 先写临时文件再原子替换, 避免并发读到半个文件
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        out = np.lib.format.open_memmap(
+            tmp_path, mode='w+', dtype=np.float16, shape=features.shape
+        )
+        out[...] = features
+        out.flush()
+        del out
+        try:
+            replaced = os.path.getsize(path)
+        except OSError:
+            replaced = 0
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            if self._size is not None:
+                self._size += os.path.getsize(path) - replaced
+            over = self._size is None or self._size > self.max_bytes
+        if over:
+            self.evict()
+        return np.load(path, mmap_mode='r')
+
+    def get_or_compute(self, audio: Union[np.ndarray, 'torch.Tensor'],
+                       encoder: str,
+                       compute_fn: Callable[[], Union[np.ndarray, 'torch.Tensor']],
+                       layer: Optional[int] = None) -> np.ndarray:
+        """命中则直接返回, 否则调用compute_fn计算并缓存
+
+        命中与未命中都返回同一份fp16数据, 保证结果与缓存状态无关。
+        """
+        if not self.enabled:
+            return self._to_numpy(compute_fn())
+
+        key = self.make_key(self.audio_hash(audio), encoder, layer)
+        features = self.get(key)
+        if features is not None:
+            self.hits += 1
+            return features
+
+        self.misses += 1
+        return self.put(key, self._to_numpy(compute_fn()))
+
+    @staticmethod
+    def _to_numpy(features) -> np.ndarray:
+        if hasattr(features, 'detach'):
+            features = features.detach().float().cpu().numpy()
+        return np.asarray(features)
+
+    def evict(self) -> int:
+        """扫描目录, 超过上限时按最近访问时间淘汰到上限的EVICT_TARGET_RATIO"""
+        with self._lock:
+            entries = []
+            total = 0
+            for root, _, files in os.walk(self.cache_dir):
+                for name in files:
+                    if not name.endswith('.npy'):
+                        continue
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+                    total += stat.st_size
+
+            removed = 0
+            target = self.max_bytes * EVICT_TARGET_RATIO if total > self.max_bytes else total
+            entries.sort()
+            for _, size, path in entries:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                    removed += 1
+                except FileNotFoundError:
+                    continue
+
+            self._size = total
+            if removed:
+                logger.info(f"Evicted {removed} cached feature files")
+            return removed
+
+    def stats(self) -> dict:
+        """缓存命中统计"""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0
+        }
+
+_feature_cache = None
+
+def get_feature_cache() -> FeatureCache:
+    """获取进程内共享的特征缓存"""
+    global _feature_cache
+    if _feature_cache is None:
+        _feature_cache = FeatureCache()
+    return _feature_cache
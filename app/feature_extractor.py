@@ -3,8 +3,19 @@ import torch.nn.functional as F
 import numpy as np
 from typing import Optional, Dict
 from config import HUBERT_CONFIG
+from .feature_cache import get_feature_cache
 import librosa
 
+# HuBERT卷积特征编码器的感受野(采样点)
+HUBERT_RECEPTIVE_FIELD = 400
+
+def hubert_frame_count(n_samples: int, hop_length: Optional[int] = None) -> int:
+    """整段一次前向时HuBERT输出的帧数"""
+    hop_length = hop_length or HUBERT_CONFIG['hop_length']
+    if n_samples < HUBERT_RECEPTIVE_FIELD:
+        return 0
+    return (n_samples - HUBERT_RECEPTIVE_FIELD) // hop_length + 1
+
 class HubertExtractor:
     """Hubert特征提取器"""
     def __init__(self, model: Dict, device: torch.device):
@@ -16,38 +27,72 @@ class HubertExtractor:
     def extract_features(self, audio: np.ndarray) -> torch.Tensor:
         """提取特征"""
         # 转换为tensor
-        audio_tensor = torch.FloatTensor(audio).unsqueeze(0).to(self.device)
+        audio_tensor = torch.FloatTensor(audio).unsqueeze(0)
+        return self._forward(audio_tensor)
         
-        # 提取特征
+    def _forward(self, batch: torch.Tensor) -> torch.Tensor:
+        """批量提取特征, 输入[B, L], 输出[B, D, T]"""
         with torch.no_grad():
-            features = self.model.extract_features(audio_tensor)[0]
-            features = features.transpose(1, 2)  # [B, T, D]
+            features = self.model.extract_features(batch.to(self.device))[0]
+            features = features.transpose(1, 2)  # [B, D, T]
             
         return features
         
-    def process_long_audio(self, audio: np.ndarray, chunk_size: int = 160000) -> torch.Tensor:
-        """处理长音频"""
-        # 分割音频
-        chunks = []
-        for i in range(0, len(audio), chunk_size):
-            chunk = audio[i:i + chunk_size]
-            if len(chunk) < chunk_size:
-                # 填充最后一个块
-                chunk = np.pad(chunk, (0, chunk_size - len(chunk)))
-            chunks.append(chunk)
+    def process_long_audio(self, audio: np.ndarray,
+                           chunk_size: Optional[int] = None,
+                           overlap: Optional[int] = None,
+                           max_batch_samples: Optional[int] = None) -> torch.Tensor:
+        """处理长音频
+
+        每块两侧各带overlap采样点上下文(至少一个帧移), 多个块堆叠成批次前向,
+        单批采样点数不超过max_batch_samples。每块只保留中心部分的帧,
+        拼接后裁到与整段一次前向相同的帧数, 输出[1, D, hubert_frame_count(len(audio))]。
+        """
+        chunk_size = chunk_size or HUBERT_CONFIG['chunk_size']
+        overlap = HUBERT_CONFIG['chunk_overlap'] if overlap is None else overlap
+        max_batch_samples = max_batch_samples or HUBERT_CONFIG['max_batch_samples']
+        hop = self.hop_length
+        
+        # 对齐到帧移
+        overlap = max(1, int(np.ceil(overlap / hop))) * hop
+        chunk_size = max(chunk_size // hop * hop, 2 * overlap + hop)
+        stride = chunk_size - 2 * overlap
+        
+        # 短音频一次前向
+        if len(audio) <= chunk_size:
+            return self.extract_features(audio)
+        n_frames = hubert_frame_count(len(audio), hop)
             
-        # 提取特征
+        # 分割音频(首尾补零使每块长度一致)
+        n_chunks = int(np.ceil(len(audio) / stride))
+        padded = np.pad(
+            audio.astype(np.float32),
+            (overlap, n_chunks * stride + overlap - len(audio))
+        )
+        chunks = np.stack([
+            padded[i * stride:i * stride + chunk_size] for i in range(n_chunks)
+        ])
+        
+        # 按批次提取特征, 去掉重叠部分
+        keep_start = overlap // hop
+        keep_frames = stride // hop
+        batch_size = max(1, max_batch_samples // chunk_size)
         features = []
-        for chunk in chunks:
-            feat = self.extract_features(chunk)
-            features.append(feat)
+        for i in range(0, n_chunks, batch_size):
+            feats = self._forward(torch.from_numpy(chunks[i:i + batch_size]))
+            feats = feats[:, :, keep_start:keep_start + keep_frames]
+            # [B, D, T] -> [D, B*T], 保持块顺序
+            features.append(feats.permute(1, 0, 2).reshape(feats.size(1), -1))
             
-        # 合并特征
-        features = torch.cat(features, dim=1)
-        return features
+        # 合并特征并裁掉填充帧
+        features = torch.cat(features, dim=1)[:, :n_frames]
+        return features.unsqueeze(0)
 
 class ContentVecExtractor:
     """ContentVec特征提取器"""
+    encoder_name = 'contentvec'
+    output_layer = 12  # 使用第12层特征
+    
     def __init__(self, model_path: str, device: torch.device):
         self.model = self._load_model(model_path).to(device)
         self.device = device
@@ -69,7 +114,7 @@ class ContentVecExtractor:
         inputs = {
             'source': audio.to(self.device),
             'padding_mask': padding_mask.to(self.device),
-            'output_layer': 12,  # 使用第12层特征
+            'output_layer': self.output_layer,
         }
         
         # 提取特征
@@ -82,12 +127,18 @@ class ContentVecExtractor:
         audio, sr = librosa.load(audio_path, sr=16000)  # ContentVec需要16kHz
         audio = torch.FloatTensor(audio).unsqueeze(0)
         
-        # 提取特征
-        features = self.extract_features(audio)
-        return features
+        # 提取特征(按音频内容缓存)
+        features = get_feature_cache().get_or_compute(
+            audio, self.encoder_name,
+            lambda: self.extract_features(audio),
+            layer=self.output_layer
+        )
+        return torch.from_numpy(np.asarray(features, dtype=np.float32))
 
 class HubertSoftExtractor:
     """HubertSoft特征提取器"""
+    encoder_name = 'hubertsoft'
+    
     def __init__(self, model_path: str, device: torch.device):
         self.model = torch.jit.load(model_path).to(device)
         self.device = device
@@ -110,9 +161,12 @@ class HubertSoftExtractor:
         audio, sr = librosa.load(audio_path, sr=16000)  # HubertSoft需要16kHz
         audio = torch.FloatTensor(audio)
         
-        # 提取特征
-        features = self.extract_features(audio)
-        return features
+        # 提取特征(按音频内容缓存)
+        features = get_feature_cache().get_or_compute(
+            audio, self.encoder_name,
+            lambda: self.extract_features(audio)
+        )
+        return torch.from_numpy(np.asarray(features, dtype=np.float32))
 
 class WhisperPPGExtractor:
     """Whisper PPG特征提取器"""
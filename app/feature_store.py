@@ -0,0 +1,238 @@
+import os
+import json
+import logging
+import numpy as np
+import soundfile as sf
+from typing import Dict, List, Optional
+from config import AUDIO_SAMPLE_RATE, FEATURE_STORE_CONFIG
+
+logger = logging.getLogger(__name__)
+
+META_FILE = 'meta.json'
+
+# 每个分片的数据文件: 名称 -> 存储类型
+FIELDS = {
+    'audio': np.int16,    # 音频 [T]
+    'mel': np.float16,    # mel频谱, 按帧连续存储 [frames, n_mels]
+    'f0': np.float16      # 基频 [frames]
+}
+
+# 分片索引: 每个片段在各数据文件中的偏移和长度(元素数)
+INDEX_DTYPE = np.dtype([
+    ('audio_offset', np.int64), ('audio_length', np.int64),
+    ('mel_offset', np.int64), ('mel_frames', np.int64),
+    ('f0_offset', np.int64), ('f0_length', np.int64)
+])
+
+def _shard_dir(store_dir: str, shard: int) -> str:
+    return os.path.join(store_dir, f"shard_{shard:03d}")
+
+class PackedFeatureWriter:
+    """打包特征写入器
+
+    按顺序追加片段, 每个分片的音频(int16)、mel(fp16)和F0(fp16)各写入一个连续文件,
+    关闭时写出偏移索引和元数据。数据先写入.tmp文件, 分片写完后再os.replace到位,
+    重新打包时已经memmap旧分片的读取方仍然读到完整的旧文件。
+    """
+    def __init__(self, store_dir: str, shard_size: Optional[int] = None,
+                 sample_rate: int = AUDIO_SAMPLE_RATE):
+        self.store_dir = store_dir
+        self.shard_size = shard_size or FEATURE_STORE_CONFIG['shard_size']
+        self.sample_rate = sample_rate
+        self.names: List[str] = []
+        self.n_mels = None
+        self.shard_counts: List[int] = []
+        self._files = {}
+        self._index: List[tuple] = []
+        self._offsets = {}
+        os.makedirs(store_dir, exist_ok=True)
+
+    def _open_shard(self):
+        shard_dir = _shard_dir(self.store_dir, len(self.shard_counts))
+        os.makedirs(shard_dir, exist_ok=True)
+        self._files = {
+            name: open(os.path.join(shard_dir, f"{name}.bin.tmp"), 'wb') for name in FIELDS
+        }
+        self._offsets = {name: 0 for name in FIELDS}
+        self._index = []
+        self.shard_counts.append(0)
+
+    def _close_shard(self):
+        for f in self._files.values():
+            f.close()
+        shard_dir = _shard_dir(self.store_dir, len(self.shard_counts) - 1)
+        with open(os.path.join(shard_dir, 'index.npy.tmp'), 'wb') as f:
+            np.save(f, np.array(self._index, dtype=INDEX_DTYPE))
+        # 不能原地截断: 旧文件可能正被读取方映射
+        for name in FIELDS:
+            path = os.path.join(shard_dir, f"{name}.bin")
+            os.replace(f"{path}.tmp", path)
+        os.replace(os.path.join(shard_dir, 'index.npy.tmp'), os.path.join(shard_dir, 'index.npy'))
+        self._files = {}
+
+    def add(self, name: str, audio: np.ndarray, mel: np.ndarray, f0: np.ndarray):
+        """追加一个片段, audio为[-1, 1]浮点或int16, mel为[n_mels, frames]"""
+        if not self._files or self.shard_counts[-1] >= self.shard_size:
+            if self._files:
+                self._close_shard()
+            self._open_shard()
+
+        if audio.dtype != np.int16:
+            audio = np.clip(np.round(np.asarray(audio, dtype=np.float32) * 32768), -32768, 32767)
+        if self.n_mels is None:
+            self.n_mels = mel.shape[0]
+        elif mel.shape[0] != self.n_mels:
+            raise ValueError(f"Segment {name} has {mel.shape[0]} mel bins, expected {self.n_mels}")
+
+        arrays = {
+            'audio': np.asarray(audio).astype(np.int16),
+            'mel': np.ascontiguousarray(np.asarray(mel).T, dtype=np.float16),
+            'f0': np.asarray(f0, dtype=np.float16)
+        }
+        entry = []
+        for field, data in arrays.items():
+            data.tofile(self._files[field])
+            length = len(data)
+            entry.extend([self._offsets[field], length])
+            self._offsets[field] += length
+        self._index.append(tuple(entry))
+        self.names.append(name)
+        self.shard_counts[-1] += 1
+
+    def close(self):
+        """写出索引和元数据"""
+        if self._files:
+            self._close_shard()
+        meta = {
+            'sample_rate': self.sample_rate,
+            'n_mels': self.n_mels,
+            'shards': self.shard_counts,
+            'names': self.names
+        }
+        tmp_path = os.path.join(self.store_dir, f"{META_FILE}.tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, os.path.join(self.store_dir, META_FILE))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class PackedFeatureStore:
+    """打包特征读取器: 各数据文件以np.memmap只读映射, 取片段时不复制数据
+
+    load_into_memory把分片读入共享内存, DataLoader worker之间共用一份;
+    序列化时只传目录和共享内存张量, worker中重新映射文件而不复制内容。
+    """
+    def __init__(self, store_dir: str):
+        self.store_dir = store_dir
+        self._shared = {}  # (分片, 字段) -> 共享内存张量
+        with open(os.path.join(store_dir, META_FILE)) as f:
+            meta = json.load(f)
+        self.sample_rate = meta['sample_rate']
+        self.n_mels = meta['n_mels']
+        self.names = meta['names']
+        self._positions = {name: i for i, name in enumerate(self.names)}
+
+        # (分片, 分片内序号)
+        self._locations = []
+        self._shards = []
+        for shard, count in enumerate(meta['shards']):
+            shard_dir = _shard_dir(store_dir, shard)
+            data = {}
+            for field, dtype in FIELDS.items():
+                path = os.path.join(shard_dir, f"{field}.bin")
+                # 空文件不能映射
+                data[field] = (np.memmap(path, dtype=dtype, mode='r')
+                               if os.path.getsize(path) else np.zeros(0, dtype=dtype))
+            data['index'] = np.load(os.path.join(shard_dir, 'index.npy'))
+            self._shards.append(data)
+            self._locations.extend((shard, i) for i in range(count))
+
+    def load_into_memory(self, max_bytes: int) -> int:
+        """按分片顺序把数据文件读入共享内存, 总量不超过max_bytes, 返回已载入的字节数"""
+        import torch
+        
+        loaded = sum(t.numel() * t.element_size() for t in self._shared.values())
+        for shard, data in enumerate(self._shards):
+            for field in FIELDS:
+                array = data[field]
+                if (shard, field) in self._shared or not len(array):
+                    continue
+                if loaded + array.nbytes > max_bytes:
+                    return loaded
+                tensor = torch.from_numpy(np.array(array)).share_memory_()
+                self._shared[(shard, field)] = tensor
+                data[field] = tensor.numpy()
+                loaded += array.nbytes
+        return loaded
+
+    def __getstate__(self):
+        return {'store_dir': self.store_dir, 'shared': self._shared}
+
+    def __setstate__(self, state):
+        self.__init__(state['store_dir'])
+        self._shared = state['shared']
+        for (shard, field), tensor in self._shared.items():
+            self._shards[shard][field] = tensor.numpy()
+
+    @staticmethod
+    def exists(store_dir: str) -> bool:
+        return os.path.exists(os.path.join(store_dir, META_FILE))
+
+    def __len__(self):
+        return len(self.names)
+
+    def position(self, name: str) -> int:
+        """片段名称对应的序号"""
+        return self._positions[name]
+
+    def audio_lengths(self) -> np.ndarray:
+        """各片段的音频样本数(按序号), 不读取数据"""
+        return np.concatenate([data['index']['audio_length'] for data in self._shards]) \
+            if self._shards else np.zeros(0, dtype=np.int64)
+
+    def __getitem__(self, idx: int) -> Dict[str, np.ndarray]:
+        """返回片段的内存映射视图: audio为int16, mel为fp16 [n_mels, frames], f0为fp16"""
+        shard, i = self._locations[idx]
+        data = self._shards[shard]
+        entry = data['index'][i]
+        audio_start = entry['audio_offset']
+        mel_start = entry['mel_offset'] * self.n_mels
+        f0_start = entry['f0_offset']
+        return {
+            'audio': data['audio'][audio_start:audio_start + entry['audio_length']],
+            'mel': data['mel'][mel_start:mel_start + entry['mel_frames'] * self.n_mels]
+                   .reshape(-1, self.n_mels).T,
+            'f0': data['f0'][f0_start:f0_start + entry['f0_length']]
+        }
+
+def find_segment_dirs(dataset_dir: str) -> List[str]:
+    """查找包含audio.wav/mel.npy/f0.npy的片段目录(相对路径, 排序)"""
+    segments = []
+    for root, _, files in os.walk(dataset_dir):
+        if {'audio.wav', 'mel.npy', 'f0.npy'} <= set(files):
+            segments.append(os.path.relpath(root, dataset_dir))
+    return sorted(segments)
+
+def convert_segment_dirs(dataset_dir: str, store_dir: Optional[str] = None,
+                         shard_size: Optional[int] = None) -> str:
+    """把已有的segment_XXXX目录转换为打包格式, 片段名称为相对目录名"""
+    store_dir = store_dir or os.path.join(dataset_dir, FEATURE_STORE_CONFIG['dir_name'])
+    segments = find_segment_dirs(dataset_dir)
+    with PackedFeatureWriter(store_dir, shard_size) as writer:
+        for name in segments:
+            segment_dir = os.path.join(dataset_dir, name)
+            audio, sr = sf.read(os.path.join(segment_dir, 'audio.wav'), dtype='int16')
+            if sr != writer.sample_rate:
+                raise ValueError(f"Segment {name} has sample rate {sr}, expected {writer.sample_rate}")
+            writer.add(
+                name,
+                audio,
+                np.load(os.path.join(segment_dir, 'mel.npy')),
+                np.load(os.path.join(segment_dir, 'f0.npy'))
+            )
+    logger.info(f"Packed {len(segments)} segments into {store_dir}")
+    return store_dir
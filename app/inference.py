@@ -13,17 +13,31 @@ from config import (
 )
 from .f0_predictor import F0Predictor
 from .feature_extractor import HubertExtractor
+from .feature_cache import get_feature_cache
+from .preprocess import detect_voiced_intervals
+from .synthesizer import SynthesizerTrn, prepare_for_inference, trace_infer
+from .quantization import quantize_model, load_quantized_cache, quantize_and_cache, is_quantized
 import logging
 
 logger = logging.getLogger(__name__)
 
 class SVCInference:
     """SVC推理接口"""
-    def __init__(self, model_path: str, config_path: str):
-        self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    def __init__(self, model_path: str, config_path: str, device: Optional[str] = None,
+                 hubert=None):
+        if device is None:
+            device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        self.device = torch.device(device)
+        self.traced = None
+        self.last_stats = {}
+        # 动态int8量化只用于CPU推理
+        self.quantized = SVC_INFERENCE_CONFIG['quantize'] and self.device.type == 'cpu'
         self.model = self.load_model(model_path, config_path)
         self.config = self.load_config(config_path)
-        self.hubert = self.load_hubert()
+        # 内容编码器与音色无关, 多个音色模型可共用同一实例
+        self.hubert = hubert if hubert is not None else self.load_hubert()
+        # 特征缓存按编码器变体区分, fp32和int8量化的HuBERT输出不共用缓存
+        self.hubert_cache_name = 'hubert-soft-int8' if is_quantized(self.hubert) else 'hubert-soft'
         self.f0_predictor = F0Predictor()
         
     def load_model(self, model_path: str, config_path: str):
@@ -32,47 +46,142 @@ class SVCInference:
         with open(config_path) as f:
             config = json.load(f)
             
-        # 初始化模型
-        model = SynthesizerTrn(
-            **config['model']
-        ).to(self.device)
+        # int8量化模式: 缓存有效时直接量化模型骨架并加载int8权重, 跳过fp32权重
+        model = None
+        if self.quantized:
+            skeleton = SynthesizerTrn(**config['model']).to(self.device)
+            model = load_quantized_cache(prepare_for_inference(skeleton), model_path)
+            
+        if model is None:
+            # 初始化模型
+            model = SynthesizerTrn(
+                **config['model']
+            ).to(self.device)
+            
+            # 加载权重
+            model.load_state_dict(
+                torch.load(model_path, map_location=self.device)['model']
+            )
+            model.eval()
+            
+            # 推理优化: 去掉enc_q, 折叠weight norm
+            if SVC_INFERENCE_CONFIG['optimize'] or self.quantized:
+                model = prepare_for_inference(model)
+                
+            if self.quantized:
+                model = quantize_and_cache(model, model_path)
+                
+        # CPU上可选trace推理路径
+        if SVC_INFERENCE_CONFIG['trace'] and self.device.type == 'cpu':
+            try:
+                self.traced = trace_infer(model, self._example_inputs(config))
+            except Exception as e:
+                logger.warning(f"Failed to trace model, using eager mode: {str(e)}")
+        return model
         
-        # 加载权重
-        model.load_state_dict(
-            torch.load(model_path, map_location=self.device)['model']
+    def _example_inputs(self, config: Dict, n_frames: int = 100):
+        """trace用的示例输入(c, f0, g, c_lengths)"""
+        return (
+            torch.randn(1, config['model']['ssl_dim'], n_frames, device=self.device),
+            torch.full((1, n_frames), 200.0, device=self.device),
+            torch.LongTensor([0]).to(self.device),
+            torch.LongTensor([n_frames]).to(self.device)
         )
-        model.eval()
-        return model
+        
+    def run_model(self, c: torch.Tensor, f0: torch.Tensor, g: torch.Tensor) -> torch.Tensor:
+        """运行生成器(有trace版本时优先使用)"""
+        c_lengths = torch.LongTensor([c.size(-1)] * c.size(0)).to(self.device)
+        # trace时的示例输入batch为1, 批量变体走eager路径
+        if self.traced is not None and c.size(0) == 1:
+            return self.traced(c, f0, g, c_lengths)
+        return self.model.infer(c, f0, g=g, c_lengths=c_lengths)
         
     def infer(self, audio_path: str, 
               output_path: str,
               speaker_id: int = 0,
               pitch_adjust: float = 0) -> bool:
         """执行推理"""
+        return self.infer_variants(audio_path, [{
+            'output_path': output_path,
+            'speaker_id': speaker_id,
+            'pitch_adjust': pitch_adjust
+        }])[0]
+        
+    def infer_variants(self, audio_path: str, variants: List[Dict]) -> List[bool]:
+        """同一音频的多个变体推理, variants为[{'output_path', 'speaker_id', 'pitch_adjust'}]
+        
+        内容特征和F0只提取一次(变体之间F0只差一个比例因子),
+        flow和decoder按批处理多条F0曲线与说话人嵌入, 结果分别写入各自的输出路径。
+        开启静音门控时只转换非静音区间, 输出与输入逐样本对齐。
+        """
+        results = [False] * len(variants)
+        sample_rate = self.config['audio']['sample_rate']
         try:
             # 加载音频
-            audio, sr = librosa.load(audio_path, sr=self.config['audio']['sample_rate'])
+            audio, sr = librosa.load(audio_path, sr=sample_rate)
             
-            # 提取特征
-            with torch.no_grad():
-                # 提取内容特征
-                c = self.extract_features(audio)
-                # 提取F0
-                f0 = self.extract_f0(audio, pitch_adjust)
-                
-                # 生成
-                audio = self.model.infer(
-                    c, f0,
-                    g=torch.LongTensor([speaker_id]).to(self.device)
-                )[0,0].data.cpu().float().numpy()
-                
-            # 保存结果
-            sf.write(output_path, audio, self.config['audio']['sample_rate'])
-            return True
+            if SVC_INFERENCE_CONFIG['vad']:
+                regions = self.voiced_regions(audio, sample_rate)
+            else:
+                regions = [(0, len(audio))]
+            converted = sum(end - start for start, end in regions)
+            self.last_stats = {
+                'regions': len(regions),
+                'silence_skipped': 1 - converted / len(audio) if len(audio) else 0.0
+            }
             
+            outputs = np.zeros((len(variants), len(audio)), dtype=np.float32)
+            with torch.inference_mode():
+                for start, end in regions:
+                    self._convert_region(audio[start:end], variants, outputs[:, start:end])
+                    
+            # 保存结果
+            for i, (variant, output) in enumerate(zip(variants, outputs)):
+                sf.write(variant['output_path'], output, sample_rate)
+                results[i] = True
+                
         except Exception as e:
             logger.error(f"Inference failed: {str(e)}")
-            return False
+        return results
+        
+    def _convert_region(self, segment: np.ndarray, variants: List[Dict], out: np.ndarray):
+        """转换一段音频的全部变体, 结果按样本写入out[变体, 样本]"""
+        # 提取内容特征
+        c = self.extract_features(segment)
+        # 提取F0(对齐到内容特征帧, 不做音高偏移)
+        f0 = self.extract_f0(segment, n_frames=c.size(-1))
+        
+        batch_size = max(1, SVC_INFERENCE_CONFIG['variant_batch_size'])
+        for start in range(0, len(variants), batch_size):
+            batch = variants[start:start + batch_size]
+            # 半音转换为F0比例
+            scales = torch.FloatTensor(
+                [2 ** (v.get('pitch_adjust', 0) / 12) for v in batch]
+            ).unsqueeze(1).to(self.device)
+            g = torch.LongTensor([v.get('speaker_id', 0) for v in batch]).to(self.device)
+            
+            # 生成
+            audio = self.run_model(
+                c.expand(len(batch), -1, -1), f0 * scales, g
+            )[:, 0].data.cpu().float().numpy()
+            
+            # 生成长度按帧取整, 截断到原片段长度
+            n = min(audio.shape[-1], out.shape[-1])
+            out[start:start + len(batch), :n] = audio[:, :n]
+            
+    def voiced_regions(self, audio: np.ndarray, sample_rate: int) -> List[tuple]:
+        """需要转换的非静音区间: 两侧各留上下文, 间隔过短的区间合并"""
+        pad = int(SVC_INFERENCE_CONFIG['vad_pad_seconds'] * sample_rate)
+        min_gap = int(SVC_INFERENCE_CONFIG['vad_min_silence'] * sample_rate)
+        
+        regions = []
+        for start, end in detect_voiced_intervals(audio, top_db=SVC_INFERENCE_CONFIG['vad_top_db']):
+            start, end = max(0, int(start) - pad), min(len(audio), int(end) + pad)
+            if regions and start - regions[-1][1] < min_gap:
+                regions[-1] = (regions[-1][0], max(regions[-1][1], end))
+            else:
+                regions.append((start, end))
+        return regions
         
     def load_config(self, config_path: str) -> Dict:
         """加载配置文件"""
@@ -84,16 +193,36 @@ class SVCInference:
         from fairseq import checkpoint_utils
         hubert_path = os.path.join('pretrain', 'hubert-soft-0d54a1f4.pt')
         models, cfg, task = checkpoint_utils.load_model_ensemble_and_task([hubert_path])
-        return models[0].to(self.device)
+        hubert = models[0].to(self.device).eval()
+        if self.quantized:
+            hubert = quantize_model(hubert)
+        return hubert
         
     def extract_features(self, audio: np.ndarray) -> torch.Tensor:
-        """提取特征"""
-        with torch.no_grad():
+        """提取特征(内容特征与目标音色无关, 按音频内容缓存)"""
+        features = get_feature_cache().get_or_compute(
+            audio, self.hubert_cache_name, lambda: self._extract_features(audio)
+        )
+        return torch.from_numpy(np.asarray(features, dtype=np.float32)).to(self.device)
+        
+    def _extract_features(self, audio: np.ndarray) -> torch.Tensor:
+        """运行HuBERT提取特征"""
+        with torch.inference_mode():
             audio = torch.FloatTensor(audio).unsqueeze(0).to(self.device)
             feats = self.hubert.extract_features(audio, padding_mask=None, mask=False)[0]
             return feats.transpose(1, 2)
             
-    def extract_f0(self, audio: np.ndarray, pitch_adjust: float = 0) -> torch.Tensor:
+    def extract_f0(self, audio: np.ndarray, pitch_adjust: float = 0,
+                   n_frames: Optional[int] = None) -> torch.Tensor:
         """提取F0"""
-        f0 = self.f0_predictor.compute_f0_with_pitch_shift(audio, pitch_adjust)
+        if n_frames is None:
+            f0 = self.f0_predictor.compute_f0_with_pitch_shift(audio, pitch_adjust)
+        else:
+            # 内容特征帧按实际时长均分(HuBERT输入未重采样到16kHz, 帧移不是320/16000秒)
+            hop_seconds = len(audio) / self.config['audio']['sample_rate'] / max(1, n_frames)
+            f0, vuv = self.f0_predictor.compute_aligned_f0(
+                audio, n_frames, hop_seconds=hop_seconds, pitch_shift=pitch_adjust
+            )
+            # 清音帧F0置0
+            f0 = f0 * vuv
         return torch.FloatTensor(f0).unsqueeze(0).to(self.device)
\ No newline at end of file
@@ -1,5 +1,7 @@
 import torch 
 import torch.nn.functional as F
+from config import AUDIO_SAMPLE_RATE
+from .spectral import mel_spectrogram
 
 def feature_loss(fmap_r, fmap_g):
     loss = 0
@@ -49,4 +51,14 @@ def kl_loss(z_p, logs_q, m_p, logs_p, z_mask):
     kl += 0.5 * ((z_p - m_p)**2) * torch.exp(-2. * logs_p)
     kl = torch.sum(kl * z_mask)
     l = kl / torch.sum(z_mask)
-    return l 
\ No newline at end of file
+    return l 
+
+def mel_loss(y_hat, y, sample_rate=AUDIO_SAMPLE_RATE):
+    """
+    y_hat, y: [b, 1, t]或[b, t] 生成与目标音频
+    对数mel幅度谱的L1距离
+    """
+    mel_hat = mel_spectrogram(y_hat.float().reshape(-1, y_hat.size(-1)), sample_rate, power=1.0)
+    mel = mel_spectrogram(y.float().reshape(-1, y.size(-1)), sample_rate, power=1.0)
+    return F.l1_loss(torch.log(torch.clamp(mel_hat, min=1e-5)),
+                     torch.log(torch.clamp(mel, min=1e-5)))
@@ -2,7 +2,7 @@ import os
 import json
 import shutil
 from typing import Dict, List, Optional
-from config import SVC_DIR
+from config import SVC_DIR, SVC_MODEL_PATH, SVC_CONFIG_PATH, TRAINING_JOB_CONFIG
 from scripts.path_utils import normalize_path, ensure_directory
 import logging
 
@@ -14,6 +14,7 @@ class SVCModelLibrary:
     def __init__(self):
         self.model_dir = 'logs/44k'
         self.config_dir = 'configs'
+        self.training_dir = os.path.abspath(TRAINING_JOB_CONFIG['train_dir'])
         os.makedirs(self.model_dir, exist_ok=True)
         os.makedirs(self.config_dir, exist_ok=True)
         
@@ -38,6 +39,21 @@ class SVCModelLibrary:
                     })
         return models
         
+    def resolve_model(self, name: Optional[str]) -> Dict:
+        """按模型名称或说话人名称查找模型, 'default'或空值对应SVC_MODEL_PATH"""
+        if not name or name == 'default':
+            return {
+                'name': 'default',
+                'path': SVC_MODEL_PATH,
+                'config_path': SVC_CONFIG_PATH
+            }
+        models = self.get_available_models()
+        for key in ('name', 'speaker_name'):
+            for model in models:
+                if model[key] == name:
+                    return model
+        raise ValueError(f"SVC model not found: {name}")
+        
     def add_model(self, model_path: str, config_path: str,
                  speaker_name: str, description: str = '') -> bool:
         """添加新模型到库中"""
@@ -1,14 +1,58 @@
 import os
+import io
+import pickle
+import zipfile
 import logging
 import hashlib
 import requests
 from tqdm import tqdm
-from typing import Optional
+from typing import Any, Optional
 from config import HUBERT_CONFIG, SVC_MODEL_PATH, SVC_CONFIG_PATH
 from scripts.path_utils import normalize_path, ensure_directory
 
 logger = logging.getLogger(__name__)
 
+class _TensorPlaceholder:
+    """代替checkpoint中的张量/存储对象, 不读取实际数据"""
+    def __init__(self, *args, **kwargs):
+        pass
+        
+    def __setstate__(self, state):
+        pass
+
+class _HeaderUnpickler(pickle.Unpickler):
+    """只解析checkpoint的对象结构(字典和键), 不导入torch也不读取张量数据"""
+    SAFE_MODULES = {'builtins', 'collections', '_codecs'}
+    
+    def find_class(self, module, name):
+        if module in self.SAFE_MODULES:
+            return super().find_class(module, name)
+        return _TensorPlaceholder
+        
+    def persistent_load(self, pid):
+        return None
+
+def read_checkpoint_header(model_path: str) -> Any:
+    """读取checkpoint的顶层对象结构
+
+    zip格式(torch>=1.6)只解压data.pkl, 旧格式依次解析文件头部的pickle记录,
+    张量都以占位对象代替, 开销与权重大小无关。
+    """
+    if zipfile.is_zipfile(model_path):
+        with zipfile.ZipFile(model_path) as archive:
+            names = [n for n in archive.namelist() if n.endswith('/data.pkl') or n == 'data.pkl']
+            if not names:
+                raise ValueError(f"No data.pkl in checkpoint archive: {model_path}")
+            with archive.open(min(names, key=len)) as f:
+                return _HeaderUnpickler(io.BytesIO(f.read())).load()
+                
+    # 旧格式: magic number, 协议版本, 系统信息, 对象
+    with open(model_path, 'rb') as f:
+        unpickler = _HeaderUnpickler(f)
+        for _ in range(3):
+            unpickler.load()
+        return unpickler.load()
+
 class ModelManager:
     """模型管理器"""
     def __init__(self):
@@ -59,12 +103,12 @@ class ModelManager:
                     logger.error(f"Hash mismatch for {model_path}")
                     return False
                     
-            # 尝试加载模型验证格式
-            import torch
-            model_data = torch.load(model_path, map_location='cpu')
+            # 只读取文件头验证格式
+            model_data = read_checkpoint_header(model_path)
             
             # 验证模型结构
-            if 'model' not in model_data and 'state_dict' not in model_data:
+            if not isinstance(model_data, dict) or (
+                    'model' not in model_data and 'state_dict' not in model_data):
                 raise ValueError("Invalid model format")
                 
             return True
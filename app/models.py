@@ -1,11 +1,6 @@
+import json
 from . import db
 from datetime import datetime
-import torch
-import torch.nn as nn
-import torch.nn.functional as F
-from torch.nn import Conv1d
-from torch.nn.utils import weight_norm, remove_weight_norm
-from app.modules import commons, modules, attentions
 
 class BatchTask(db.Model):
     """批量任务模型"""
@@ -33,120 +28,89 @@ class Task(db.Model):
     pitch = db.Column(db.Float, default=1.0)
     speed = db.Column(db.Float, default=1.0) 
     melody = db.Column(db.String(50), default='default')
+    tts_model = db.Column(db.String(100))  # 为空时使用TTS_MODEL_NAME
     status = db.Column(db.String(20), default='Pending')
+    stage = db.Column(db.String(20), default='pending')  # 最后完成的处理阶段
     error_message = db.Column(db.Text)  # 错误信息
     tts_output = db.Column(db.String(200))
     svc_output = db.Column(db.String(200))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     batch_id = db.Column(db.Integer, db.ForeignKey('batch_task.id'), nullable=True)
     
+    # 阶段状态机: pending -> tts_done -> svc_done, 阶段完成时与产物路径一起提交
+    STAGES = ('pending', 'tts_done', 'svc_done')
+    STAGE_OUTPUTS = {'tts_done': 'tts_output', 'svc_done': 'svc_output'}
+    
+    def complete_stage(self, stage: str, output_path: str):
+        """记录阶段完成及其产物"""
+        setattr(self, self.STAGE_OUTPUTS[stage], output_path)
+        self.stage = stage
+        
+    def resume_stage(self, is_valid) -> str:
+        """返回产物仍然有效的最后一个已完成阶段, 重试从它的下一阶段继续"""
+        reached = self.STAGES.index(self.stage or 'pending')
+        for stage in reversed(self.STAGES[1:reached + 1]):
+            if is_valid(getattr(self, self.STAGE_OUTPUTS[stage])):
+                self.stage = stage
+                return stage
+        self.stage = 'pending'
+        return 'pending'
+        
     def __repr__(self):
         return f'<Task {self.id}>'
 
-class SynthesizerTrn(nn.Module):
-    """
-    Synthesizer for Training
-    """
-    def __init__(self, 
-                 spec_channels,
-                 segment_size,
-                 inter_channels,
-                 hidden_channels,
-                 filter_channels,
-                 n_heads,
-                 n_layers,
-                 kernel_size,
-                 p_dropout,
-                 resblock, 
-                 resblock_kernel_sizes,
-                 resblock_dilation_sizes,
-                 upsample_rates,
-                 upsample_initial_channel,
-                 upsample_kernel_sizes,
-                 gin_channels,
-                 ssl_dim,
-                 n_speakers,
-                 **kwargs):
-        super().__init__()
-        
-        self.spec_channels = spec_channels
-        self.inter_channels = inter_channels
-        self.hidden_channels = hidden_channels
-        self.filter_channels = filter_channels
-        self.n_heads = n_heads
-        self.n_layers = n_layers
-        self.kernel_size = kernel_size
-        self.p_dropout = p_dropout
-        self.resblock = resblock
-        self.resblock_kernel_sizes = resblock_kernel_sizes
-        self.resblock_dilation_sizes = resblock_dilation_sizes
-        self.upsample_rates = upsample_rates
-        self.upsample_initial_channel = upsample_initial_channel
-        self.upsample_kernel_sizes = upsample_kernel_sizes
-        self.segment_size = segment_size
-        self.gin_channels = gin_channels
-        self.ssl_dim = ssl_dim
-        
-        self.enc_p = modules.ContentEncoder(
-            hidden_channels,
-            filter_channels,
-            n_heads,
-            n_layers,
-            kernel_size,
-            p_dropout,
-            ssl_dim=ssl_dim
-        )
-        
-        self.dec = modules.Generator(
-            inter_channels,
-            resblock,
-            resblock_kernel_sizes,
-            resblock_dilation_sizes,
-            upsample_rates,
-            upsample_initial_channel,
-            upsample_kernel_sizes,
-            gin_channels=gin_channels
-        )
-        
-        self.enc_q = modules.PosteriorEncoder(
-            spec_channels,
-            inter_channels,
-            hidden_channels,
-            5,
-            1,
-            16,
-            gin_channels=gin_channels
-        )
-        
-        self.flow = modules.ResidualCouplingBlock(
-            inter_channels, hidden_channels, 5, 1, 3, gin_channels=gin_channels
-        )
-        
-        self.emb_g = nn.Embedding(n_speakers, gin_channels)
-        
-    def forward(self, c, f0, spec, g=None, mel=None, c_lengths=None, spec_lengths=None):
-        # Content encoder
-        c_mask = torch.unsqueeze(commons.sequence_mask(c_lengths, c.size(2)), 1).to(c.dtype)
-        z_p, m_p, logs_p, _ = self.enc_p(c, c_mask, f0=f0)
-        
-        # Posterior encoder
-        z_q, m_q, logs_q = self.enc_q(spec, g=g)
-        
-        # Flow
-        z_f = self.flow(z_q, g=g)
-        
-        # Generator
-        z_p = self.flow(z_p, g=g, reverse=True)
-        o = self.dec(z_p * c_mask, g=g)
-        
-        return o, z_f, m_p, logs_p, m_q, logs_q
+class TrainingJob(db.Model):
+    """训练任务模型: 由training队列的worker更新, 进度和取消接口只读写这条记录"""
+    id = db.Column(db.Integer, primary_key=True)
+    speaker_name = db.Column(db.String(100), nullable=False)
+    description = db.Column(db.Text)
+    config = db.Column(db.Text)  # 训练参数(JSON)
+    audio_path = db.Column(db.String(300))
+    status = db.Column(db.String(20), default='queued')
+    progress = db.Column(db.Integer, default=0)  # 进度百分比
+    message = db.Column(db.String(200))
+    train_dir = db.Column(db.String(300))
+    model_path = db.Column(db.String(300))
+    error_message = db.Column(db.Text)
+    celery_task_id = db.Column(db.String(50))
+    cancel_requested = db.Column(db.Boolean, default=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    # 状态: queued -> preparing -> training -> completed/error/cancelled
+    FINISHED = ('completed', 'error', 'cancelled')
+    
+    @property
+    def is_finished(self) -> bool:
+        return self.status in self.FINISHED
         
-    def infer(self, c, f0, g=None, mel=None, c_lengths=None):
-        c_mask = torch.unsqueeze(commons.sequence_mask(c_lengths, c.size(2)), 1).to(c.dtype)
-        z_p, m_p, logs_p, c_mask = self.enc_p(c, c_mask, f0=f0)
+    def get_config(self) -> dict:
+        return json.loads(self.config or '{}')
         
-        # Generator
-        z_p = self.flow(z_p, g=g, reverse=True)
-        o = self.dec(z_p * c_mask, g=g)
+    def finish(self, status: str, message: str = None, error: str = None):
+        """记录任务结束"""
+        self.status = status
+        self.message = message
+        self.error_message = error
+        self.finished_at = datetime.utcnow()
+        if status == 'completed':
+            self.progress = 100
+            
+    def to_dict(self) -> dict:
+        return {
+            'job_id': self.id,
+            'speaker_name': self.speaker_name,
+            'status': self.status,
+            'progress': self.progress or 0,
+            'message': self.message or '',
+            'error': self.error_message,
+            'model_path': self.model_path,
+            'cancel_requested': bool(self.cancel_requested),
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
         
-        return o
\ No newline at end of file
+    def __repr__(self):
+        return f'<TrainingJob {self.id}>'
@@ -1,134 +1,411 @@
 import os
 import librosa
+import multiprocessing
 import numpy as np
 import soundfile as sf
 from tqdm import tqdm
-from config import AUDIO_SAMPLE_RATE
+from contextlib import nullcontext
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from config import AUDIO_SAMPLE_RATE, PREPROCESS_CONFIG, FEATURE_STORE_CONFIG, SPECTRAL_CONFIG
 from .audio_processor import AudioProcessor
+from .feature_store import PackedFeatureStore, convert_segment_dirs
+from .spectral import log_mel_spectrogram
+from .preprocess_manifest import (
+    PreprocessManifest, array_sha1, params_digest, segment_checksums
+)
 import pyworld
 import random
 import logging
+from typing import Callable, Dict, Iterator, List, Optional
+from .f0_predictor import compute_f0_chunked, should_chunk_f0
 
 logger = logging.getLogger(__name__)
 
-def prepare_dataset(audio_path: str, output_dir: str):
-    """准备训练数据集"""
+# 预处理版本, 处理逻辑变化时递增使已有清单失效
+PREPROCESS_VERSION = 1
+
+# 清单中每次刷新之间最多完成的片段数
+MANIFEST_FLUSH_INTERVAL = 50
+
+# 片段切分参数(参考so-vits-svc)
+SPLIT_PARAMS = {'top_db': 30, 'min_length': 2.0, 'max_length': 8.0}
+
+# F0提取参数(帧移毫秒; 整段提取固定用WORLD dio)
+F0_PARAMS = {'method': 'dio', 'frame_period': 5.0}
+
+class TrainingCancelled(Exception):
+    """训练任务被取消(由progress_callback等回调抛出, 不视为预处理失败)"""
+
+def preprocess_params() -> Dict:
+    """影响片段输出的处理参数(与切分和特征提取使用的是同一份参数)"""
+    return {
+        'version': PREPROCESS_VERSION,
+        'sample_rate': AUDIO_SAMPLE_RATE,
+        'split': dict(SPLIT_PARAMS),
+        'mel': dict(SPECTRAL_CONFIG),
+        'f0': dict(F0_PARAMS)
+    }
+
+def process_segment(index: int, segment: np.ndarray, output_dir: str) -> Dict[str, str]:
+    """处理单个片段并写入segment_{index:04d}目录(进程池中执行), 返回输出文件校验和"""
+    # 标准化和去除静音
+    segment = AudioProcessor().process_audio(
+        segment,
+        normalize=True,
+        trim_silence=True
+    )
+    
+    # 提取特征
+    mel = extract_mel_spectrogram(segment)
+    f0 = extract_f0(segment)
+    
+    # 保存文件
+    segment_dir = os.path.join(output_dir, f"segment_{index:04d}")
+    os.makedirs(segment_dir, exist_ok=True)
+    
+    # 保存音频
+    sf.write(
+        os.path.join(segment_dir, "audio.wav"),
+        segment,
+        AUDIO_SAMPLE_RATE
+    )
+    
+    # 保存特征
+    np.save(os.path.join(segment_dir, "mel.npy"), mel)
+    np.save(os.path.join(segment_dir, "f0.npy"), f0)
+    return segment_checksums(segment_dir)
+
+def prepare_dataset(audio_path: str, output_dir: str,
+                    num_workers: Optional[int] = None,
+                    progress_callback: Optional[Callable[[int, int], None]] = None):
+    """准备训练数据集
+    
+    片段边切分边分发到进程池并行处理, 在途片段数有上限, 长录音流式读取时内存与时长无关;
+    输出目录按片段序号命名, 与完成顺序无关; 清单中已是最新的片段跳过不处理;
+    progress_callback(已完成数, 已切分数)在每个片段完成后调用。
+    """
     try:
         # 1. 创建必要的目录
         os.makedirs(output_dir, exist_ok=True)
         
-        # 2. 加载和预处理音频
-        audio_processor = AudioProcessor()
-        audio, sr = librosa.load(audio_path, sr=AUDIO_SAMPLE_RATE)
+        # 2. 对照清单, 只处理新增、变化或输出缺失的片段
+        manifest = PreprocessManifest(output_dir)
+        params = preprocess_params()
+        digest = params_digest(params)
+        manifest.set_source(audio_path, params)
         
-        # 3. 分割音频
-        segments = split_audio(audio)
-        logger.info(f"Split audio into {len(segments)} segments")
+        num_workers = max(1, num_workers or PREPROCESS_CONFIG['num_workers'])
+        if num_workers > 1 and multiprocessing.current_process().daemon:
+            # Celery prefork的子进程是守护进程, 不能再创建进程池, 改为串行处理
+            logger.info("Running in a daemonic worker process, preprocessing segments serially")
+            num_workers = 1
+        names = []
+        counts = {'skipped': 0, 'processed': 0}
         
-        # 4. 处理每个片段
-        for i, segment in tqdm(enumerate(segments), desc="Processing segments"):
-            # 标准化和去除静音
-            segment = audio_processor.process_audio(
-                segment,
-                normalize=True,
-                trim_silence=True
-            )
-            
-            # 提取特征
-            mel = extract_mel_spectrogram(segment)
-            f0 = extract_f0(segment)
-            
-            # 保存文件
-            segment_dir = os.path.join(output_dir, f"segment_{i:04d}")
-            os.makedirs(segment_dir, exist_ok=True)
-            
-            # 保存音频
-            sf.write(
-                os.path.join(segment_dir, "audio.wav"),
-                segment,
-                AUDIO_SAMPLE_RATE
-            )
+        # 3. 切分音频并处理片段
+        try:
+            with tqdm(desc="Processing segments") as bar, \
+                    (ProcessPoolExecutor(max_workers=num_workers) if num_workers > 1 else nullcontext()) as executor:
+                pending = {}
+                
+                def report():
+                    bar.update(1)
+                    if progress_callback:
+                        progress_callback(counts['skipped'] + counts['processed'], len(names))
+                        
+                def finish(name, input_hash, outputs):
+                    manifest.record(name, input_hash, digest, outputs)
+                    counts['processed'] += 1
+                    if counts['processed'] % MANIFEST_FLUSH_INTERVAL == 0:
+                        manifest.save()
+                    report()
+                    
+                def drain(limit):
+                    # 在途片段超过limit时等待完成, 限制待处理片段占用的内存
+                    while len(pending) > limit:
+                        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            finish(*pending.pop(future), future.result())
+                            
+                for i, segment in enumerate(iter_segments(audio_path)):
+                    name = f"segment_{i:04d}"
+                    input_hash = array_sha1(segment)
+                    names.append(name)
+                    if manifest.is_current(name, input_hash, digest):
+                        counts['skipped'] += 1
+                        report()
+                    elif executor is None:
+                        finish(name, input_hash, process_segment(i, segment, output_dir))
+                    else:
+                        pending[executor.submit(process_segment, i, segment, output_dir)] = (name, input_hash)
+                        drain(2 * num_workers)
+                drain(0)
+        finally:
+            # 中途失败时已完成的片段也记入清单, 重跑时跳过
+            manifest.save()
             
-            # 保存特征
-            np.save(os.path.join(segment_dir, "mel.npy"), mel)
-            np.save(os.path.join(segment_dir, "f0.npy"), f0)
+        removed = manifest.prune(names)
+        manifest.save()
+        logger.info(f"Split audio into {len(names)} segments: {counts['skipped']} up to date, "
+                    f"{counts['processed']} processed, {len(removed)} stale removed")
             
-        # 5. 生成文件列表
+        # 4. 生成文件列表
         create_filelist(output_dir)
         
+        # 5. 打包特征, 训练时以内存映射读取(片段无变化且已打包时跳过)
+        store_dir = os.path.join(output_dir, FEATURE_STORE_CONFIG['dir_name'])
+        if FEATURE_STORE_CONFIG['pack'] and (counts['processed'] or removed
+                                             or not PackedFeatureStore.exists(store_dir)):
+            convert_segment_dirs(output_dir)
+        
         return True
         
+    except TrainingCancelled:
+        raise
     except Exception as e:
         logger.error(f"Failed to prepare dataset: {str(e)}")
         return False
 
 def extract_mel_spectrogram(audio: np.ndarray) -> np.ndarray:
-    """提取mel频谱图"""
-    # 使用so-vits-svc的mel参数
-    mel = librosa.feature.melspectrogram(
-        y=audio,
-        sr=AUDIO_SAMPLE_RATE,
-        n_fft=2048,
-        hop_length=512,
-        win_length=2048,
-        n_mels=80,
-        fmin=0,
-        fmax=None,
-        center=False
-    )
-    mel = librosa.power_to_db(mel, ref=1.0, top_db=80.0)
-    return mel
+    """提取mel频谱图(dB), 参数见SPECTRAL_CONFIG"""
+    return log_mel_spectrogram(audio, AUDIO_SAMPLE_RATE)
 
 def extract_f0(audio: np.ndarray) -> np.ndarray:
     """提取基频"""
+    frame_period = F0_PARAMS['frame_period']
+    
+    # 长音频分块并行提取
+    if should_chunk_f0(len(audio), AUDIO_SAMPLE_RATE):
+        return compute_f0_chunked(
+            audio,
+            AUDIO_SAMPLE_RATE,
+            AUDIO_SAMPLE_RATE * frame_period / 1000,
+            method=F0_PARAMS['method']
+        )
+        
     # 使用WORLD的dio算法
     f0, t = pyworld.dio(
         audio.astype(np.double),
         fs=AUDIO_SAMPLE_RATE,
         f0_floor=50.0,
         f0_ceil=1100.0,
-        frame_period=5.0
+        frame_period=frame_period
     )
     f0 = pyworld.stonemask(audio.astype(np.double), f0, t, AUDIO_SAMPLE_RATE)
     return f0
 
+def detect_voiced_intervals(audio: np.ndarray,
+                            top_db: float = SPLIT_PARAMS['top_db'],
+                            frame_length: int = 2048,
+                            hop_length: int = 512) -> np.ndarray:
+    """能量检测非静音区间, 返回[[start, end), ...]样本下标"""
+    return librosa.effects.split(
+        audio,
+        top_db=top_db,
+        frame_length=frame_length,
+        hop_length=hop_length
+    )
+
+def _split_interval(segment: np.ndarray,
+                    min_length: float,
+                    max_length: float) -> List[np.ndarray]:
+    """过滤过短的区间, 过长的区间等分为不超过max_length的片段"""
+    segment_length = len(segment) / AUDIO_SAMPLE_RATE
+    
+    # 过滤过短的片段
+    if segment_length < min_length:
+        return []
+        
+    # 切分过长的片段
+    if segment_length > max_length:
+        n_chunks = int(np.ceil(segment_length / max_length))
+        chunk_size = len(segment) // n_chunks
+        chunks = [segment[i*chunk_size:(i+1)*chunk_size] for i in range(n_chunks)]
+        return [chunk for chunk in chunks if len(chunk) / AUDIO_SAMPLE_RATE >= min_length]
+    return [segment]
+
 def split_audio(audio: np.ndarray, 
-                min_length: float = 2.0,
-                max_length: float = 8.0) -> List[np.ndarray]:
+                min_length: float = SPLIT_PARAMS['min_length'],
+                max_length: float = SPLIT_PARAMS['max_length'],
+                top_db: float = SPLIT_PARAMS['top_db']) -> List[np.ndarray]:
     """切分音频"""
-    # 参考so-vits-svc的切分参数
     segments = []
     
     # 使用能量检测分割
-    intervals = librosa.effects.split(
-        audio,
-        top_db=30,
-        frame_length=2048,
-        hop_length=512
-    )
+    intervals = detect_voiced_intervals(audio, top_db=top_db)
     
     for start, end in intervals:
-        segment = audio[start:end]
-        segment_length = len(segment) / AUDIO_SAMPLE_RATE
-        
-        # 过滤过短的片段
-        if segment_length < min_length:
-            continue
-            
-        # 切分过长的片段
-        if segment_length > max_length:
-            n_chunks = int(np.ceil(segment_length / max_length))
-            chunk_size = len(segment) // n_chunks
-            
-            for i in range(n_chunks):
-                chunk = segment[i*chunk_size:(i+1)*chunk_size]
-                if len(chunk) / AUDIO_SAMPLE_RATE >= min_length:
-                    segments.append(chunk)
-        else:
-            segments.append(segment)
+        segments.extend(_split_interval(audio[start:end], min_length, max_length))
             
     return segments
 
+def stream_audio_blocks(audio_path: str,
+                        block_seconds: Optional[float] = None) -> Iterator[np.ndarray]:
+    """按块读取音频, 转为单声道并流式重采样到AUDIO_SAMPLE_RATE"""
+    block_seconds = block_seconds or PREPROCESS_CONFIG['stream_block_seconds']
+    info = sf.info(audio_path)
+    resampler = None
+    if info.samplerate != AUDIO_SAMPLE_RATE:
+        import soxr
+        resampler = soxr.ResampleStream(info.samplerate, AUDIO_SAMPLE_RATE, 1,
+                                        dtype='float32', quality='HQ')
+        
+    blocksize = max(1, int(block_seconds * info.samplerate))
+    for block in sf.blocks(audio_path, blocksize=blocksize, dtype='float32', always_2d=True):
+        block = block.mean(axis=1)
+        if resampler is not None:
+            block = resampler.resample_chunk(block)
+        if len(block):
+            yield block
+    if resampler is not None:
+        tail = resampler.resample_chunk(np.zeros(0, dtype=np.float32), last=True)
+        if len(tail):
+            yield tail
+
+class _FramePower:
+    """流式分帧能量: 居中分帧、两端补零, 与librosa.feature.rms(center=True)的帧一致"""
+    def __init__(self, frame_length: int = 2048, hop_length: int = 512):
+        self.frame_length = frame_length
+        self.hop_length = hop_length
+        self.n_samples = 0
+        self.n_frames = 0
+        self._buffer = np.zeros(frame_length // 2, dtype=np.float32)
+
+    def _frames(self, limit: Optional[int] = None) -> np.ndarray:
+        n = 0
+        if len(self._buffer) >= self.frame_length:
+            n = (len(self._buffer) - self.frame_length) // self.hop_length + 1
+        if limit is not None:
+            n = min(n, limit)
+        if n <= 0:
+            return np.zeros(0, dtype=np.float32)
+        frames = np.lib.stride_tricks.sliding_window_view(
+            self._buffer, self.frame_length)[::self.hop_length][:n]
+        power = np.mean(np.abs(frames) ** 2, axis=1)
+        self._buffer = self._buffer[n * self.hop_length:]
+        self.n_frames += n
+        return power
+
+    def push(self, block: np.ndarray) -> np.ndarray:
+        """追加样本, 返回新凑齐的帧的均方能量"""
+        self._buffer = np.concatenate([self._buffer, np.asarray(block, dtype=np.float32)])
+        self.n_samples += len(block)
+        return self._frames()
+
+    def finish(self) -> np.ndarray:
+        """末尾补零, 返回剩余帧"""
+        self._buffer = np.concatenate([
+            self._buffer, np.zeros(self.frame_length // 2, dtype=np.float32)
+        ])
+        return self._frames(limit=1 + self.n_samples // self.hop_length - self.n_frames)
+
+class StreamingSilenceSplitter:
+    """流式静音切分
+
+    跨块保留分帧缓冲和当前非静音区间的起点, 区间闭合即按split_audio的规则产出片段;
+    只缓存未闭合区间的样本, 超过2*max_length时先按max_length产出, 内存与录音时长无关。
+    ref_power为全录音的最大帧能量, 对应librosa.effects.split的ref=np.max。
+    """
+    def __init__(self, ref_power: float,
+                 top_db: float = SPLIT_PARAMS['top_db'],
+                 min_length: float = SPLIT_PARAMS['min_length'],
+                 max_length: float = SPLIT_PARAMS['max_length'],
+                 frame_length: int = 2048,
+                 hop_length: int = 512):
+        self.framer = _FramePower(frame_length, hop_length)
+        self.hop_length = hop_length
+        self.threshold_db = 10 * np.log10(max(1e-10, ref_power)) - top_db
+        self.min_length = min_length
+        self.max_length = max_length
+        self.max_samples = int(max_length * AUDIO_SAMPLE_RATE)
+        self._samples = np.zeros(0, dtype=np.float32)
+        self._offset = 0     # _samples[0]的样本下标
+        self._start = None   # 未闭合区间的起点
+
+    def _close(self, end: int) -> List[np.ndarray]:
+        end = min(end, self.framer.n_samples)
+        segment = self._samples[self._start - self._offset:end - self._offset]
+        self._start = None
+        return _split_interval(segment.copy(), self.min_length, self.max_length)
+
+    def _process(self, power: np.ndarray) -> List[np.ndarray]:
+        segments = []
+        first = self.framer.n_frames - len(power)
+        nonsilent = 10 * np.log10(np.maximum(1e-10, power)) > self.threshold_db
+        states = np.concatenate([[self._start is not None], nonsilent]).astype(np.int8)
+        for edge in np.flatnonzero(np.diff(states)):
+            position = (first + edge) * self.hop_length
+            if nonsilent[edge]:
+                self._start = position
+            else:
+                segments.extend(self._close(position))
+                
+        if self._start is not None:
+            # 过长的未闭合区间先产出max_length的片段
+            while self._offset + len(self._samples) - self._start >= 2 * self.max_samples:
+                begin = self._start - self._offset
+                segments.append(self._samples[begin:begin + self.max_samples].copy())
+                self._start += self.max_samples
+            keep = self._start
+        else:
+            keep = self.framer.n_frames * self.hop_length
+        keep = min(keep, self._offset + len(self._samples))
+        self._samples = self._samples[keep - self._offset:]
+        self._offset = keep
+        return segments
+
+    def push(self, block: np.ndarray) -> List[np.ndarray]:
+        """追加一块音频, 返回已闭合的片段"""
+        self._samples = np.concatenate([self._samples, np.asarray(block, dtype=np.float32)])
+        return self._process(self.framer.push(block))
+
+    def finish(self) -> List[np.ndarray]:
+        """录音结束, 返回剩余片段"""
+        segments = self._process(self.framer.finish())
+        if self._start is not None:
+            segments.extend(self._close(self.framer.n_frames * self.hop_length))
+        return segments
+
+def stream_split_audio(audio_path: str,
+                       top_db: float = SPLIT_PARAMS['top_db'],
+                       min_length: float = SPLIT_PARAMS['min_length'],
+                       max_length: float = SPLIT_PARAMS['max_length'],
+                       block_seconds: Optional[float] = None) -> Iterator[np.ndarray]:
+    """按块读取并切分音频, 找到片段即产出
+    
+    先流式扫描一遍求最大帧能量作为静音阈值参考, 再流式切分。
+    """
+    framer = _FramePower()
+    ref_power = 0.0
+    for block in stream_audio_blocks(audio_path, block_seconds):
+        power = framer.push(block)
+        if len(power):
+            ref_power = max(ref_power, float(power.max()))
+    power = framer.finish()
+    if len(power):
+        ref_power = max(ref_power, float(power.max()))
+        
+    splitter = StreamingSilenceSplitter(ref_power, top_db, min_length, max_length)
+    for block in stream_audio_blocks(audio_path, block_seconds):
+        yield from splitter.push(block)
+    yield from splitter.finish()
+
+def iter_segments(audio_path: str) -> Iterator[np.ndarray]:
+    """按顺序产出切分后的片段, 长录音流式读取"""
+    try:
+        duration = sf.info(audio_path).duration
+    except RuntimeError:
+        # libsndfile不支持的格式交给librosa(audioread)整体读取
+        duration = None
+    min_seconds = PREPROCESS_CONFIG['stream_min_seconds']
+    if duration is not None and duration >= min_seconds:
+        logger.info(f"Streaming {duration:.0f}s recording in blocks")
+        yield from stream_split_audio(audio_path, **SPLIT_PARAMS)
+        return
+        
+    audio, _ = librosa.load(audio_path, sr=AUDIO_SAMPLE_RATE)
+    yield from split_audio(audio, **SPLIT_PARAMS)
+
 def create_filelist(dataset_dir: str):
     """生成训练集文件列表"""
     # 获取所有音频文件
@@ -0,0 +1,121 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+import numpy as np
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = 'manifest.json'
+
+# 片段输出文件
+SEGMENT_OUTPUTS = ('audio.wav', 'mel.npy', 'f0.npy')
+
+def file_sha1(path: str) -> str:
+    """文件内容哈希"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def array_sha1(array: np.ndarray) -> str:
+    """数组内容哈希(含形状和类型)"""
+    array = np.ascontiguousarray(array)
+    digest = hashlib.sha1(array.tobytes())
+    digest.update(f"{array.shape}{array.dtype}".encode())
+    return digest.hexdigest()
+
+def params_digest(params: Dict) -> str:
+    """处理参数哈希"""
+    return hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+def segment_checksums(segment_dir: str) -> Dict[str, str]:
+    """片段输出文件的校验和"""
+    return {name: file_sha1(os.path.join(segment_dir, name)) for name in SEGMENT_OUTPUTS}
+
+class PreprocessManifest:
+    """预处理清单
+
+    记录源文件哈希、处理参数以及每个片段的输入哈希和输出校验和;
+    重新运行时输入、参数和输出都一致的片段直接跳过。
+    """
+    def __init__(self, output_dir: str):
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, MANIFEST_FILE)
+        self.data = {'source': {}, 'params': {}, 'segments': {}, 'steps': {}}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path) as f:
+                    self.data.update(json.load(f))
+            except (ValueError, OSError) as e:
+                logger.warning(f"Ignoring unreadable manifest {self.path}: {str(e)}")
+
+    @property
+    def segments(self) -> Dict[str, Dict]:
+        return self.data['segments']
+
+    def set_source(self, source_path: str, params: Dict):
+        """记录源文件和处理参数"""
+        self.data['source'] = {
+            'path': os.path.abspath(source_path),
+            'sha1': file_sha1(source_path)
+        }
+        self.data['params'] = params
+
+    def is_current(self, name: str, input_hash: str, digest: str) -> bool:
+        """片段是否为最新: 输入和参数未变, 输出文件存在且校验和一致"""
+        entry = self.segments.get(name)
+        if not entry or entry.get('input') != input_hash or entry.get('params') != digest:
+            return False
+        segment_dir = os.path.join(self.output_dir, name)
+        try:
+            return segment_checksums(segment_dir) == entry.get('outputs')
+        except OSError:
+            return False
+
+    def record(self, name: str, input_hash: str, digest: str, outputs: Dict[str, str]):
+        """记录片段处理结果"""
+        self.segments[name] = {'input': input_hash, 'params': digest, 'outputs': outputs}
+
+    def prune(self, keep: Iterable[str]) -> List[str]:
+        """删除本次不再产生的片段目录和记录"""
+        keep = set(keep)
+        removed = []
+        for entry in os.listdir(self.output_dir):
+            if entry.startswith('segment_') and entry not in keep:
+                shutil.rmtree(os.path.join(self.output_dir, entry), ignore_errors=True)
+                self.segments.pop(entry, None)
+                removed.append(entry)
+        for name in list(self.segments):
+            if name not in keep:
+                self.segments.pop(name)
+        return removed
+
+    def step_current(self, step: str, digest: str) -> bool:
+        """外部处理步骤(如HuBERT/F0特征提取)对应的输入是否未变"""
+        return self.data['steps'].get(step) == digest
+
+    def record_step(self, step: str, digest: str):
+        self.data['steps'][step] = digest
+
+    def save(self):
+        """原子写入清单"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.data, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+def dataset_digest(dataset_dir: str, extra: Optional[Dict] = None) -> str:
+    """数据集目录下所有清单的片段记录哈希, 用于判断后续处理步骤是否需要重跑"""
+    digest = hashlib.sha1(json.dumps(extra or {}, sort_keys=True).encode())
+    for root, _, files in sorted(os.walk(dataset_dir)):
+        if MANIFEST_FILE in files:
+            with open(os.path.join(root, MANIFEST_FILE)) as f:
+                segments = json.load(f).get('segments', {})
+            digest.update(os.path.relpath(root, dataset_dir).encode())
+            digest.update(json.dumps(segments, sort_keys=True).encode())
+    return digest.hexdigest()
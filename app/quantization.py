@@ -0,0 +1,98 @@
+import os
+import logging
+import numpy as np
+import torch
+import torch.nn as nn
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# 动态int8量化只支持Linear(卷积层没有动态量化实现, 保持fp32)
+QUANTIZABLE_LAYERS = {nn.Linear}
+
+def quantize_model(model: nn.Module) -> nn.Module:
+    """对Linear层做动态int8量化(仅CPU, 原地替换避免复制整个模型)"""
+    return torch.ao.quantization.quantize_dynamic(
+        model, QUANTIZABLE_LAYERS, dtype=torch.qint8, inplace=True
+    )
+
+def is_quantized(model: nn.Module) -> bool:
+    """模型中是否有动态量化后的层"""
+    return any(type(m).__module__.startswith('torch.ao.nn.quantized') for m in model.modules())
+
+def quantized_cache_path(model_path: str) -> str:
+    """量化权重缓存路径: model.pth -> model.int8.pth"""
+    base, ext = os.path.splitext(model_path)
+    return f"{base}.int8{ext or '.pth'}"
+
+def _source_signature(model_path: str) -> Dict:
+    stat = os.stat(model_path)
+    return {'size': stat.st_size, 'mtime': int(stat.st_mtime)}
+
+def load_quantized_cache(model: nn.Module, model_path: str) -> Optional[nn.Module]:
+    """缓存有效时直接量化模型骨架并加载int8权重, 否则返回None
+
+    model须已经过prepare_for_inference且未加载fp32权重。
+    """
+    cache_path = quantized_cache_path(model_path)
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        data = torch.load(cache_path, map_location='cpu')
+        if data.get('source') != _source_signature(model_path):
+            logger.info(f"Quantized cache is stale: {cache_path}")
+            return None
+        quantized = quantize_model(model)
+        quantized.load_state_dict(data['model'])
+        logger.info(f"Loaded quantized model from {cache_path}")
+        return quantized
+    except Exception as e:
+        logger.warning(f"Failed to load quantized cache {cache_path}: {str(e)}")
+        return None
+
+def quantize_and_cache(model: nn.Module, model_path: str) -> nn.Module:
+    """量化已加载fp32权重的模型, 并把int8权重保存到原checkpoint旁边"""
+    quantized = quantize_model(model)
+    cache_path = quantized_cache_path(model_path)
+    try:
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        torch.save({
+            'model': quantized.state_dict(),
+            'source': _source_signature(model_path)
+        }, tmp_path)
+        os.replace(tmp_path, cache_path)
+        logger.info(f"Saved quantized model to {cache_path}")
+    except OSError as e:
+        logger.warning(f"Failed to cache quantized model: {str(e)}")
+    return quantized
+
+def quality_report(reference: np.ndarray, candidate: np.ndarray,
+                   sample_rate: int) -> Dict[str, float]:
+    """客观质量对比: log-mel距离(dB)与F0误差(音分)"""
+    from .f0_predictor import F0Predictor
+    from .spectral import log_mel_spectrogram
+
+    length = min(len(reference), len(candidate))
+    reference = np.asarray(reference[:length], dtype=np.float32)
+    candidate = np.asarray(candidate[:length], dtype=np.float32)
+
+    mel_distance = float(np.mean(np.abs(
+        log_mel_spectrogram(reference, sample_rate) - log_mel_spectrogram(candidate, sample_rate)
+    )))
+
+    predictor = F0Predictor('dio')
+    predictor.sample_rate = sample_rate
+    f0_ref = predictor.compute_f0(reference)
+    f0_cand = predictor.compute_f0(candidate)
+    voiced = (f0_ref > 0) & (f0_cand > 0)
+    if voiced.any():
+        cents = 1200 * np.log2(f0_cand[voiced] / f0_ref[voiced])
+        f0_rmse = float(np.sqrt(np.mean(cents ** 2)))
+    else:
+        f0_rmse = 0.0
+
+    return {
+        'mel_distance_db': mel_distance,
+        'f0_rmse_cents': f0_rmse,
+        'vuv_error': float(np.mean((f0_ref > 0) != (f0_cand > 0)))
+    }
@@ -1,13 +1,15 @@
 from flask import Blueprint, render_template, request, redirect, url_for, send_from_directory, jsonify
-from .models import Task, BatchTask, db
-from .tasks import process_task, process_batch_task
+from . import celery
+from .models import Task, BatchTask, TrainingJob, db
+from .tasks import process_task, process_batch_task, run_training_job
 import os
 import json
+import uuid
 from werkzeug.utils import secure_filename
 import logging
-from config import ALLOWED_EXTENSIONS
+from config import ALLOWED_EXTENSIONS, ALLOWED_AUDIO_FORMATS, UPLOAD_FOLDER
 from .model_library import SVCModelLibrary
-from .trainer import SVCTrainer
+from .tts_pool import validate_tts_model
 
 main = Blueprint('main', __name__)
 
@@ -27,6 +29,9 @@ def upload_batch():
             texts = request.files['texts_file'].read().decode('utf-8').splitlines()
             params_json = request.form['params']
             params = json.loads(params_json)
+            # 创建任务前检查TTS模型, 不允许加载列表以外的模型
+            for param in params:
+                param['tts_model'] = validate_tts_model(param.get('tts_model'))
             
             # 创建批量任务
             batch = BatchTask(
@@ -44,6 +49,7 @@ def upload_batch():
                         pitch=float(param.get('pitch', 1.0)),
                         speed=float(param.get('speed', 1.0)),
                         melody=param.get('melody', 'default'),
+                        tts_model=param.get('tts_model'),
                         batch_id=batch.id
                     )
                     db.session.add(task)
@@ -66,6 +72,7 @@ def task_status(task_id):
     task = Task.query.get_or_404(task_id)
     return jsonify({
         'status': task.status,
+        'stage': task.stage,
         'error': task.error_message
     })
 
@@ -123,6 +130,11 @@ def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def allowed_audio_file(filename):
+    """检查音频文件类型是否允许"""
+    return '.' in filename and \
+           filename.rsplit('.', 1)[1].lower() in ALLOWED_AUDIO_FORMATS
+
 @main.route('/upload', methods=['GET', 'POST'])
 def upload():
     if request.method == 'GET':
@@ -142,7 +154,8 @@ def upload():
             text=text,
             pitch=pitch,
             speed=speed,
-            melody=request.form.get('melody', 'default')
+            melody=request.form.get('melody', 'default'),
+            tts_model=validate_tts_model(request.form.get('tts_model'))
         )
         db.session.add(task)
         db.session.commit()
@@ -167,13 +180,15 @@ def list_models():
 
 @main.route('/train', methods=['GET', 'POST'])
 def train_model():
-    """训练新模型"""
+    """提交训练任务, 立即返回任务ID, 训练在training队列的worker中执行"""
     if request.method == 'POST':
         try:
             # 获取音频文件
-            audio_file = request.files['audio']
-            if not audio_file:
+            audio_file = request.files.get('audio')
+            if not audio_file or not audio_file.filename:
                 return jsonify({'error': 'No audio file'}), 400
+            if not allowed_audio_file(audio_file.filename):
+                return jsonify({'error': 'Unsupported audio format'}), 400
                 
             # 获取配置
             speaker_name = request.form.get('speaker_name')
@@ -181,49 +196,61 @@ def train_model():
                 return jsonify({'error': 'No speaker name'}), 400
                 
             config = {
-                'speaker_name': speaker_name,
-                'description': request.form.get('description', ''),
                 'epochs': int(request.form.get('epochs', 100)),
                 'batch_size': int(request.form.get('batch_size', 16)),
                 'learning_rate': float(request.form.get('learning_rate', 0.0001))
             }
             
-            # 保存音频文件
+            # 保存音频文件(加前缀避免同名上传互相覆盖)
             audio_path = os.path.join(
-                app.config['UPLOAD_FOLDER'],
-                secure_filename(audio_file.filename)
+                UPLOAD_FOLDER,
+                f"train_{uuid.uuid4().hex[:8]}_{secure_filename(audio_file.filename)}"
             )
             audio_file.save(audio_path)
             
-            # 准备训练
-            trainer = SVCTrainer()
-            train_dir = trainer.prepare_training_data(audio_path, speaker_name)
+            # 创建训练任务记录
+            job = TrainingJob(
+                speaker_name=speaker_name,
+                description=request.form.get('description', ''),
+                config=json.dumps(config),
+                audio_path=audio_path,
+                message='Queued'
+            )
+            db.session.add(job)
+            db.session.commit()
             
-            # 开始训练
-            result = trainer.train_model(train_dir, config)
-            if result:
-                return jsonify({
-                    'status': 'success',
-                    'model_path': result['model_path']
-                })
-            else:
-                return jsonify({'error': 'Training failed'}), 500
-                
+            # 提交到训练队列
+            result = run_training_job.delay(job.id)
+            job.celery_task_id = result.id
+            db.session.commit()
+            
+            return jsonify({'job_id': job.id, 'status': job.status}), 202
+            
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         except Exception as e:
+            logger.error(f"Failed to submit training job: {str(e)}")
             return jsonify({'error': str(e)}), 500
             
     return render_template('train.html') 
 
-@main.route('/train/progress/<train_id>')
-def training_progress(train_id):
+@main.route('/train/progress/<int:job_id>')
+def training_progress(job_id):
     """获取训练进度"""
-    try:
-        trainer = SVCTrainer()
-        progress = trainer.get_training_progress(train_id)
-        return jsonify(progress)
-    except Exception as e:
-        return jsonify({
-            'status': 'error',
-            'progress': 0,
-            'message': str(e)
-        }), 500
\ No newline at end of file
+    job = TrainingJob.query.get_or_404(job_id)
+    return jsonify(job.to_dict())
+
+@main.route('/train/cancel/<int:job_id>', methods=['POST'])
+def cancel_training(job_id):
+    """取消训练: 排队中的任务直接取消, 运行中的任务由worker在下次进度检查时中止"""
+    job = TrainingJob.query.get_or_404(job_id)
+    if job.is_finished:
+        return jsonify({'error': f'Job already {job.status}'}), 409
+        
+    job.cancel_requested = True
+    if job.status == 'queued':
+        job.finish('cancelled', 'Training cancelled')
+        if job.celery_task_id:
+            celery.control.revoke(job.celery_task_id)
+    db.session.commit()
+    return jsonify(job.to_dict()), 202
@@ -0,0 +1,109 @@
+import threading
+import numpy as np
+import torch
+from typing import Optional, Tuple
+from config import AUDIO_SAMPLE_RATE, SPECTRAL_CONFIG
+
+# 窗函数和mel滤波器组缓存, 按参数、设备和类型区分
+_windows = {}
+_mel_bases = {}
+_lock = threading.Lock()
+
+def _as_batch(data, item_dims: int = 1) -> Tuple[torch.Tensor, bool, bool]:
+    """加上批次维, 返回(张量, 输入是否为numpy, 输入是否为单条)"""
+    is_numpy = isinstance(data, np.ndarray)
+    data = torch.from_numpy(np.asarray(data, dtype=np.float32)) if is_numpy else data
+    single = data.dim() == item_dims
+    return (data.unsqueeze(0) if single else data), is_numpy, single
+
+def _restore(spec: torch.Tensor, is_numpy: bool, single: bool):
+    if single:
+        spec = spec.squeeze(0)
+    return spec.cpu().numpy() if is_numpy else spec
+
+def hann_window(win_length: int, device=None, dtype=torch.float32) -> torch.Tensor:
+    """周期汉宁窗(与librosa/scipy的'hann'一致)"""
+    key = (win_length, str(device), dtype)
+    with _lock:
+        if key not in _windows:
+            _windows[key] = torch.hann_window(win_length, periodic=True, device=device, dtype=dtype)
+        return _windows[key]
+
+def mel_basis(sample_rate: int, n_fft: int, n_mels: int,
+              fmin: float = 0.0, fmax: Optional[float] = None,
+              device=None, dtype=torch.float32) -> torch.Tensor:
+    """mel滤波器组[n_mels, n_fft//2+1](slaney), 与librosa.filters.mel一致"""
+    key = (sample_rate, n_fft, n_mels, fmin, fmax, str(device), dtype)
+    with _lock:
+        if key not in _mel_bases:
+            import librosa
+            basis = librosa.filters.mel(sr=sample_rate, n_fft=n_fft, n_mels=n_mels, fmin=fmin, fmax=fmax)
+            _mel_bases[key] = torch.from_numpy(basis).to(device=device, dtype=dtype)
+        return _mel_bases[key]
+
+def spectrogram(audio,
+                n_fft: Optional[int] = None,
+                hop_length: Optional[int] = None,
+                win_length: Optional[int] = None,
+                power: float = 2.0,
+                center: Optional[bool] = None):
+    """线性频谱[B, n_fft//2+1, frames]
+
+    audio为[T]或[B, T]的张量或numpy数组, 返回同类型; center默认取SPECTRAL_CONFIG,
+    居中分帧时两端补零, 帧数为1 + T // hop_length, 否则为1 + (T - n_fft) // hop_length。
+    """
+    n_fft = n_fft or SPECTRAL_CONFIG['n_fft']
+    hop_length = hop_length or SPECTRAL_CONFIG['hop_length']
+    win_length = win_length or SPECTRAL_CONFIG['win_length']
+    center = SPECTRAL_CONFIG['center'] if center is None else center
+    audio, is_numpy, single = _as_batch(audio)
+    
+    stft = torch.stft(
+        audio,
+        n_fft=n_fft,
+        hop_length=hop_length,
+        win_length=win_length,
+        window=hann_window(win_length, audio.device, audio.dtype),
+        center=center,
+        pad_mode='constant',
+        return_complex=True
+    )
+    spec = stft.abs() if power == 1.0 else stft.abs() ** power
+    return _restore(spec, is_numpy, single)
+
+def mel_spectrogram(audio,
+                    sample_rate: int = AUDIO_SAMPLE_RATE,
+                    n_fft: Optional[int] = None,
+                    hop_length: Optional[int] = None,
+                    win_length: Optional[int] = None,
+                    n_mels: Optional[int] = None,
+                    fmin: Optional[float] = None,
+                    fmax: Optional[float] = None,
+                    power: float = 2.0,
+                    center: Optional[bool] = None):
+    """mel频谱[B, n_mels, frames], 参数默认取SPECTRAL_CONFIG"""
+    n_fft = n_fft or SPECTRAL_CONFIG['n_fft']
+    n_mels = n_mels or SPECTRAL_CONFIG['n_mels']
+    fmin = SPECTRAL_CONFIG['fmin'] if fmin is None else fmin
+    fmax = SPECTRAL_CONFIG['fmax'] if fmax is None else fmax
+    audio, is_numpy, single = _as_batch(audio)
+    
+    spec = spectrogram(audio, n_fft, hop_length, win_length, power=power, center=center)
+    basis = mel_basis(sample_rate, n_fft, n_mels, fmin, fmax, spec.device, spec.dtype)
+    mel = torch.matmul(basis, spec)
+    return _restore(mel, is_numpy, single)
+
+def power_to_db(spec, ref: float = 1.0, amin: float = 1e-10,
+                top_db: Optional[float] = 80.0):
+    """功率谱转dB, top_db按每条的最大值截断(与librosa.power_to_db一致)"""
+    spec, is_numpy, single = _as_batch(spec, item_dims=2)
+    log_spec = 10.0 * torch.log10(torch.clamp(spec, min=amin))
+    log_spec = log_spec - 10.0 * np.log10(max(amin, ref))
+    if top_db is not None:
+        peak = log_spec.amax(dim=tuple(range(1, log_spec.dim())), keepdim=True)
+        log_spec = torch.maximum(log_spec, peak - top_db)
+    return _restore(log_spec, is_numpy, single)
+
+def log_mel_spectrogram(audio, sample_rate: int = AUDIO_SAMPLE_RATE, top_db: Optional[float] = 80.0):
+    """dB刻度mel频谱, 预处理保存的mel特征"""
+    return power_to_db(mel_spectrogram(audio, sample_rate), top_db=top_db)
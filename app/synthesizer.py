@@ -0,0 +1,171 @@
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from torch.nn import Conv1d
+from torch.nn.utils import weight_norm, remove_weight_norm
+from torch.nn.utils import parametrize
+from typing import Optional, Tuple
+from app.modules import commons, modules, attentions
+
+class SynthesizerTrn(nn.Module):
+    """
+    Synthesizer for Training
+    """
+    def __init__(self, 
+                 spec_channels,
+                 segment_size,
+                 inter_channels,
+                 hidden_channels,
+                 filter_channels,
+                 n_heads,
+                 n_layers,
+                 kernel_size,
+                 p_dropout,
+                 resblock, 
+                 resblock_kernel_sizes,
+                 resblock_dilation_sizes,
+                 upsample_rates,
+                 upsample_initial_channel,
+                 upsample_kernel_sizes,
+                 gin_channels,
+                 ssl_dim,
+                 n_speakers,
+                 **kwargs):
+        super().__init__()
+        
+        self.spec_channels = spec_channels
+        self.inter_channels = inter_channels
+        self.hidden_channels = hidden_channels
+        self.filter_channels = filter_channels
+        self.n_heads = n_heads
+        self.n_layers = n_layers
+        self.kernel_size = kernel_size
+        self.p_dropout = p_dropout
+        self.resblock = resblock
+        self.resblock_kernel_sizes = resblock_kernel_sizes
+        self.resblock_dilation_sizes = resblock_dilation_sizes
+        self.upsample_rates = upsample_rates
+        self.upsample_initial_channel = upsample_initial_channel
+        self.upsample_kernel_sizes = upsample_kernel_sizes
+        self.segment_size = segment_size
+        self.gin_channels = gin_channels
+        self.ssl_dim = ssl_dim
+        
+        self.enc_p = modules.ContentEncoder(
+            hidden_channels,
+            filter_channels,
+            n_heads,
+            n_layers,
+            kernel_size,
+            p_dropout,
+            ssl_dim=ssl_dim
+        )
+        
+        self.dec = modules.Generator(
+            inter_channels,
+            resblock,
+            resblock_kernel_sizes,
+            resblock_dilation_sizes,
+            upsample_rates,
+            upsample_initial_channel,
+            upsample_kernel_sizes,
+            gin_channels=gin_channels
+        )
+        
+        self.enc_q = modules.PosteriorEncoder(
+            spec_channels,
+            inter_channels,
+            hidden_channels,
+            5,
+            1,
+            16,
+            gin_channels=gin_channels
+        )
+        
+        self.flow = modules.ResidualCouplingBlock(
+            inter_channels, hidden_channels, 5, 1, 3, gin_channels=gin_channels
+        )
+        
+        self.emb_g = nn.Embedding(n_speakers, gin_channels)
+        
+    def forward(self, c, f0, spec, g=None, mel=None, c_lengths=None, spec_lengths=None):
+        # Content encoder
+        c_mask = torch.unsqueeze(commons.sequence_mask(c_lengths, c.size(2)), 1).to(c.dtype)
+        z_p, m_p, logs_p, _ = self.enc_p(c, c_mask, f0=f0)
+        
+        # Posterior encoder
+        z_q, m_q, logs_q = self.enc_q(spec, g=g)
+        
+        # Flow
+        z_f = self.flow(z_q, g=g)
+        
+        # Generator
+        z_p = self.flow(z_p, g=g, reverse=True)
+        o = self.dec(z_p * c_mask, g=g)
+        
+        return o, z_f, m_p, logs_p, m_q, logs_q
+        
+    def infer(self, c, f0, g=None, mel=None, c_lengths=None):
+        # 说话人id转为嵌入 [B, gin_channels, 1]
+        if g is not None and not g.is_floating_point():
+            g = self.emb_g(g).unsqueeze(-1)
+        c_mask = torch.unsqueeze(commons.sequence_mask(c_lengths, c.size(2)), 1).to(c.dtype)
+        z_p, m_p, logs_p, c_mask = self.enc_p(c, c_mask, f0=f0)
+        
+        # Generator
+        z_p = self.flow(z_p, g=g, reverse=True)
+        o = self.dec(z_p * c_mask, g=g)
+        
+        return o
+
+def fold_weight_norm(model: nn.Module) -> int:
+    """把weight norm折叠进普通权重, 返回处理的层数"""
+    folded = 0
+    for module in model.modules():
+        # torch.nn.utils.weight_norm(旧接口, forward pre-hook)
+        try:
+            remove_weight_norm(module)
+            folded += 1
+            continue
+        except ValueError:
+            pass
+        # torch.nn.utils.parametrizations.weight_norm
+        if parametrize.is_parametrized(module, 'weight'):
+            parametrize.remove_parametrizations(module, 'weight', leave_parametrized=True)
+            folded += 1
+    return folded
+
+class _InferWrapper(nn.Module):
+    """把SynthesizerTrn.infer包装成forward, 供torch.jit.trace使用"""
+    def __init__(self, model: SynthesizerTrn):
+        super().__init__()
+        self.model = model
+        
+    def forward(self, c, f0, g, c_lengths):
+        return self.model.infer(c, f0, g=g, c_lengths=c_lengths)
+
+def trace_infer(model: SynthesizerTrn, example_inputs: Tuple[torch.Tensor, ...]):
+    """用示例输入trace推理路径并冻结, 返回的模块以(c, f0, g, c_lengths)调用"""
+    with torch.inference_mode(False), torch.no_grad():
+        traced = torch.jit.trace(_InferWrapper(model).eval(), example_inputs, check_trace=False)
+        traced = torch.jit.freeze(traced)
+        return torch.jit.optimize_for_inference(traced)
+
+def prepare_for_inference(model: SynthesizerTrn,
+                          example_inputs: Optional[Tuple[torch.Tensor, ...]] = None) -> nn.Module:
+    """推理优化
+
+    去掉推理用不到的后验编码器enc_q, 折叠weight norm, 冻结参数;
+    给出example_inputs时再trace推理路径(仅CPU)。必须在load_state_dict之后调用,
+    处理后的模型只能用于infer。
+    """
+    model.eval()
+    if hasattr(model, 'enc_q'):
+        del model.enc_q
+    fold_weight_norm(model)
+    for param in model.parameters():
+        param.requires_grad_(False)
+        
+    if example_inputs is not None:
+        return trace_infer(model, example_inputs)
+    return model
@@ -1,12 +1,23 @@
 from . import celery, db
-from .models import Task, BatchTask
-from .utils import generate_tts, apply_svc, cleanup_files
+from .models import Task, BatchTask, TrainingJob
+from .utils import (
+    generate_tts, time_stretch_tts, apply_svc, cleanup_files, is_valid_artifact
+)
+from .time_stretch import can_time_stretch
+from .tts_pool import get_tts_pool, validate_tts_model
+from .tts_cache import get_tts_cache
 import logging
 import traceback
 from celery.exceptions import SoftTimeLimitExceeded
 import os
-from .inference import SVCInference
-from config import SVC_OUTPUT_DIR
+import math
+import time
+import queue
+import threading
+from datetime import datetime
+from collections import OrderedDict
+from .worker import get_inference, get_voice_cache, memory_report
+from config import SVC_OUTPUT_DIR, SVC_INFERENCE_CONFIG, WORKER_CONFIG, TRAINING_JOB_CONFIG
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -18,23 +29,43 @@ def process_task(self, task_id, batch_id=None):
     if not task:
         logger.error(f"Task ID {task_id} not found.")
         return
+        
+    # TTS模型不在允许列表中时直接失败, 不重试
+    try:
+        validate_tts_model(task.tts_model)
+    except ValueError as e:
+        task.status = 'Error'
+        task.error_message = str(e)
+        db.session.commit()
+        logger.error(f"Task {task_id} rejected: {str(e)}")
+        if batch_id:
+            update_batch_status.delay(batch_id, 'Error')
+        return
     
     try:
+        # 从产物仍然有效的最后一个阶段继续(重试或worker丢失后重新投递)
+        stage = task.resume_stage(is_valid_artifact)
+        if stage != 'pending':
+            logger.info(f"Task ID {task_id} resuming after stage {stage}")
+            
         # TTS处理
-        task.status = 'Processing TTS'
-        db.session.commit()
-        
-        tts_path = generate_tts(task.text, task.pitch, task.speed)
-        task.tts_output = tts_path
-        db.session.commit()
-        
+        if stage == 'pending':
+            task.status = 'Processing TTS'
+            db.session.commit()
+            
+            tts_path = generate_tts(task.text, task.pitch, task.speed, task.tts_model)
+            task.complete_stage('tts_done', tts_path)
+            db.session.commit()
+            stage = 'tts_done'
+            
         # SVC处理
-        task.status = 'Processing SVC'
-        db.session.commit()
-        
-        svc_path = apply_svc(tts_path, task.melody)
-        task.svc_output = svc_path
-        
+        if stage == 'tts_done':
+            task.status = 'Processing SVC'
+            db.session.commit()
+            
+            svc_path = apply_svc(task.tts_output, task.melody)
+            task.complete_stage('svc_done', svc_path)
+            
         task.status = 'Completed'
         db.session.commit()
         
@@ -49,19 +80,22 @@ def process_task(self, task_id, batch_id=None):
         if isinstance(e, SoftTimeLimitExceeded):
             error_msg = "Task exceeded time limit"
         
+        # 已完成阶段的产物保留给重试复用
         task.status = 'Error'
         task.error_message = f"Error: {error_msg}\n{traceback.format_exc()}"
         db.session.commit()
         
-        logger.error(f"Task {task_id} failed: {error_msg}")
-        cleanup_files(task.tts_output, task.svc_output)
+        logger.error(f"Task {task_id} failed at stage {task.stage}: {error_msg}")
         
-        # 重试任务
-        try:
-            self.retry(exc=e)
-        except self.MaxRetriesExceededError:
+        # 重试次数用尽(retry会直接重新抛出原异常), 清理保留给重试的中间产物
+        if self.max_retries is not None and self.request.retries >= self.max_retries:
+            cleanup_files(task.tts_output, task.svc_output)
             if batch_id:
                 update_batch_status.delay(batch_id, 'Error')
+            raise
+            
+        # 重试任务
+        self.retry(exc=e)
 
 @celery.task
 def update_batch_progress(batch_id):
@@ -95,6 +129,62 @@ def update_batch_status(batch_id, status):
     except Exception as e:
         logger.error(f"Failed to update batch status: {str(e)}")
 
+def _pitch_semitones(pitch: float) -> float:
+    """任务的音高比例(1.0为原调)转换为半音"""
+    if not pitch or pitch <= 0:
+        return 0.0
+    return 12 * math.log2(pitch)
+
+def _variant_groups(tasks):
+    """按(文本, 语速, TTS模型, 音色, TTS输出)分组, 组内任务只差音高"""
+    groups = OrderedDict()
+    for task in tasks:
+        key = (task.text, task.speed, task.tts_model, task.melody, task.tts_output)
+        groups.setdefault(key, []).append(task)
+    return list(groups.values())
+
+def _pipelined(items, produce, depth: int = 2):
+    """在后台线程中按顺序对items执行produce, 结果经有界队列逐个交给调用方
+    
+    产出(item, result, error); 队列满时生产者阻塞(背压), 调用方提前结束时生产者随之退出。
+    """
+    results = queue.Queue(maxsize=max(1, depth))
+    stop = threading.Event()
+    done = object()
+    
+    def put(entry) -> bool:
+        while not stop.is_set():
+            try:
+                results.put(entry, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+        
+    def worker():
+        for item in items:
+            if stop.is_set():
+                return
+            try:
+                entry = (item, produce(item), None)
+            except Exception as e:
+                entry = (item, None, e)
+            if not put(entry):
+                return
+        put(done)
+        
+    thread = threading.Thread(target=worker, name='tts-producer', daemon=True)
+    thread.start()
+    try:
+        while True:
+            entry = results.get()
+            if entry is done:
+                break
+            yield entry
+    finally:
+        stop.set()
+        thread.join()
+
 @celery.task(bind=True)
 def process_batch_task(self, batch_id):
     """处理批量任务"""
@@ -107,45 +197,192 @@ def process_batch_task(self, batch_id):
         batch.status = 'Processing'
         db.session.commit()
         
-        # 初始化推理器
-        inferencer = SVCInference()
-        if not inferencer.load_models():
-            raise RuntimeError("Failed to load models")
-        
-        # 处理每个子任务
+        # 文本、语速和音色相同的任务只差音高, 共用一次TTS和特征提取
+        # 产物仍然有效的已完成任务直接跳过, 其余从第一个未完成阶段继续
+        pending = []
         for task in batch.tasks:
             try:
-                # 生成输出路径
-                output_path = os.path.join(
-                    SVC_OUTPUT_DIR,
-                    f"svc_{task.id}.wav"
-                )
-                
-                # 执行推理
-                if inferencer.infer(
-                    task.tts_output,
-                    output_path,
-                    pitch_shift=task.pitch,
-                    speaker_id=0  # TODO: 支持多说话人
-                ):
-                    task.svc_output = output_path
-                    task.status = 'Completed'
-                else:
-                    task.status = 'Error'
-                    task.error_message = "Inference failed"
-                    
-                db.session.commit()
-                
-            except Exception as e:
+                validate_tts_model(task.tts_model)
+            except ValueError as e:
                 task.status = 'Error'
                 task.error_message = str(e)
-                db.session.commit()
-                logger.error(f"Task {task.id} failed: {str(e)}")
+                continue
+            stage = task.resume_stage(is_valid_artifact)
+            if stage == 'svc_done':
+                task.status = 'Completed'
+                continue
+            if stage == 'pending':
+                task.tts_output = None
+            pending.append(task)
+        db.session.commit()
+        
+        groups = _variant_groups(pending)
+        jobs = [
+            (group[0].text, group[0].speed, group[0].tts_model, group[0].tts_output)
+            for group in groups
+        ]
+        busy = {'tts': 0.0, 'svc': 0.0}
+        base_tts = {}   # (文本, TTS模型) -> 原速TTS(变速复用)
+        used_tts = set()
+        
+        def synthesize(job):
+            text, speed, model_name, tts_path = job
+            start = time.perf_counter()
+            try:
+                if not tts_path:
+                    if can_time_stretch(speed):
+                        # 同一文本只合成一次原速TTS, 其他语速由变速得到
+                        key = (text, model_name)
+                        if key not in base_tts:
+                            base_tts[key] = generate_tts(text, 1.0, 1.0, model_name)
+                        tts_path = base_tts[key]
+                        if speed != 1.0:
+                            tts_path = time_stretch_tts(tts_path, speed)
+                    else:
+                        tts_path = generate_tts(text, 1.0, speed, model_name)
+                used_tts.add(tts_path)
+                return tts_path
+            finally:
+                busy['tts'] += time.perf_counter() - start
+                
+        # TTS在后台线程中提前生成, 与当前组的SVC转换重叠执行
+        started = time.perf_counter()
+        pipeline = _pipelined(jobs, synthesize, WORKER_CONFIG['pipeline_depth'])
+        try:
+            for group, (_, tts_path, error) in zip(groups, pipeline):
+                svc_start = time.perf_counter()
+                try:
+                    if error is not None:
+                        raise error
+                    first = group[0]
+                    for task in group:
+                        task.complete_stage('tts_done', tts_path)
+                        task.status = 'Processing SVC'
+                    db.session.commit()
+                
+                    # 按音色获取推理器(已加载的模型直接复用)
+                    inferencer = get_inference(first.melody)
                 
+                    # 执行推理
+                    output_paths = [
+                        os.path.join(SVC_OUTPUT_DIR, f"svc_{task.id}.wav") for task in group
+                    ]
+                    results = inferencer.infer_variants(tts_path, [{
+                        'output_path': output_path,
+                        'speaker_id': SVC_INFERENCE_CONFIG['speaker_id'],
+                        'pitch_adjust': _pitch_semitones(task.pitch)
+                    } for task, output_path in zip(group, output_paths)])
+                
+                    for task, output_path, ok in zip(group, output_paths, results):
+                        if ok:
+                            task.complete_stage('svc_done', output_path)
+                            task.status = 'Completed'
+                            logger.info(f"Task {task.id} converted, "
+                                        f"silence skipped {inferencer.last_stats.get('silence_skipped', 0):.1%}")
+                        else:
+                            task.status = 'Error'
+                            task.error_message = "Inference failed"
+                        
+                    db.session.commit()
+                
+                except Exception as e:
+                    for task in group:
+                        task.status = 'Error'
+                        task.error_message = str(e)
+                    db.session.commit()
+                    logger.error(f"Tasks {[task.id for task in group]} failed: {str(e)}")
+                finally:
+                    busy['svc'] += time.perf_counter() - svc_start
+        finally:
+            # 消费循环异常退出时也要关闭生成器, 让生产者线程停止并被回收
+            pipeline.close()
+                
+        # 只用于变速的原速TTS不属于任何任务
+        cleanup_files(*(set(base_tts.values()) - used_tts))
+        
         batch.status = 'Completed'
         db.session.commit()
+        logger.info(f"Batch {batch_id} pipeline: wall {time.perf_counter() - started:.1f}s, "
+                    f"TTS busy {busy['tts']:.1f}s, SVC busy {busy['svc']:.1f}s")
+        logger.info(f"Batch {batch_id} TTS pool: {get_tts_pool().stats()}, "
+                    f"segment cache: {get_tts_cache().stats()}")
+        logger.info(f"Batch {batch_id} done, worker memory: {memory_report()}, "
+                    f"voice cache: {get_voice_cache().stats()}")
         
     except Exception as e:
         batch.status = 'Error'
         db.session.commit()
-        logger.error(f"Batch {batch_id} failed: {str(e)}")
\ No newline at end of file
+        logger.error(f"Batch {batch_id} failed: {str(e)}")
+
+# 训练耗时数小时: 不延迟确认(Redis可见性超时后会重复投递), 使用单独的时间限制
+@celery.task(bind=True, queue=TRAINING_JOB_CONFIG['queue'], acks_late=False,
+             time_limit=TRAINING_JOB_CONFIG['time_limit'],
+             soft_time_limit=TRAINING_JOB_CONFIG['time_limit'] - 60)
+def run_training_job(self, job_id):
+    """后台训练任务: 预处理数据并训练, 进度和状态写入TrainingJob记录"""
+    # 延迟导入, Web进程注册任务时不加载torch
+    from .trainer import SVCTrainer, TrainingCancelled
+    
+    job = TrainingJob.query.get(job_id)
+    if not job:
+        logger.error(f"Training job {job_id} not found.")
+        return
+    if job.status != 'queued' or job.cancel_requested:
+        logger.info(f"Training job {job_id} is {job.status}, skipping")
+        return
+        
+    job.status = 'preparing'
+    job.message = 'Preparing training data...'
+    job.celery_task_id = self.request.id
+    job.started_at = datetime.utcnow()
+    db.session.commit()
+    
+    trainer = None
+    last_beat = [0.0]
+    
+    def heartbeat(train_dir, force=False):
+        """定期把训练进度写入记录, 发现取消请求时中止"""
+        now = time.monotonic()
+        if not force and now - last_beat[0] < TRAINING_JOB_CONFIG['poll_seconds']:
+            return
+        last_beat[0] = now
+        db.session.refresh(job)
+        if job.cancel_requested:
+            raise TrainingCancelled()
+        if train_dir:
+            progress = trainer.get_training_progress(train_dir)
+            if progress['status'] in ('preparing', 'training'):
+                job.progress = int(progress['progress'])
+                job.message = progress['message'][:200]
+            db.session.commit()
+            
+    try:
+        trainer = SVCTrainer(heartbeat=heartbeat)
+        job.train_dir = trainer.prepare_training_data(job.audio_path, job.speaker_name)
+        db.session.commit()
+        heartbeat(job.train_dir, force=True)
+        
+        job.status = 'training'
+        job.message = 'Training...'
+        db.session.commit()
+        config = dict(job.get_config(), speaker_name=job.speaker_name,
+                      description=job.description or '')
+        result = trainer.train_model(job.train_dir, config)
+        if not result:
+            raise RuntimeError('Training failed')
+            
+        job.model_path = result['model_path']
+        job.finish('completed', 'Training completed')
+        logger.info(f"Training job {job_id} completed: {job.model_path}")
+        
+    except TrainingCancelled:
+        job.finish('cancelled', 'Training cancelled')
+        logger.info(f"Training job {job_id} cancelled")
+    except SoftTimeLimitExceeded:
+        job.finish('error', error='Training time limit exceeded')
+        logger.error(f"Training job {job_id} exceeded the time limit")
+    except Exception as e:
+        job.finish('error', error=str(e))
+        logger.error(f"Training job {job_id} failed: {str(e)}\n{traceback.format_exc()}")
+    finally:
+        db.session.commit()
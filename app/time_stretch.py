@@ -0,0 +1,54 @@
+import numpy as np
+from config import TIME_STRETCH_CONFIG
+
+def can_time_stretch(rate: float) -> bool:
+    """语速是否在允许用变速代替重新合成的范围内"""
+    return (TIME_STRETCH_CONFIG['enabled']
+            and TIME_STRETCH_CONFIG['min_rate'] <= rate <= TIME_STRETCH_CONFIG['max_rate'])
+
+def wsola(audio: np.ndarray,
+          rate: float,
+          sample_rate: int,
+          frame_seconds: float = 0.03,
+          tolerance_seconds: float = 0.01) -> np.ndarray:
+    """WSOLA变速不变调, rate>1加快(输出变短)
+
+    每个合成帧在名义位置附近±tolerance内搜索与上一帧自然延续最相似的输入帧,
+    汉宁窗50%重叠相加并按窗函数和归一化, 输出长度为round(len/rate)。
+    """
+    x = np.asarray(audio, dtype=np.float32)
+    if rate == 1.0 or len(x) == 0:
+        return x.copy()
+
+    n = max(2, int(frame_seconds * sample_rate) // 2 * 2)
+    hs = n // 2                      # 合成帧移
+    ha = hs * rate                   # 分析帧移
+    delta = int(tolerance_seconds * sample_rate)
+    out_len = int(round(len(x) / rate))
+    n_frames = out_len // hs + 1
+
+    # 两侧补零, 保证搜索范围和最后一帧不越界
+    right = int(np.ceil(n_frames * ha)) + n + 2 * delta + hs - len(x)
+    padded = np.pad(x, (delta, max(0, right)))
+    window = np.hanning(n + 1)[:n].astype(np.float32)
+
+    out = np.zeros(n_frames * hs + n, dtype=np.float32)
+    norm = np.zeros_like(out)
+    prev = 0
+    for k in range(n_frames):
+        nominal = int(round(k * ha))
+        if k == 0:
+            pos = nominal
+        else:
+            # 上一帧的自然延续作为目标, 与候选区间做互相关
+            target = padded[prev + hs + delta:prev + hs + delta + n]
+            candidates = padded[nominal:nominal + n + 2 * delta]
+            corr = np.correlate(candidates, target, mode='valid')
+            pos = nominal - delta + int(np.argmax(corr))
+        out[k * hs:k * hs + n] += window * padded[pos + delta:pos + delta + n]
+        norm[k * hs:k * hs + n] += window
+        prev = pos
+
+    out = out[:out_len]
+    norm = norm[:out_len]
+    return np.where(norm > 1e-3, out / np.maximum(norm, 1e-3), 0.0).astype(np.float32)
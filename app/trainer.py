@@ -1,26 +1,63 @@
 import os
+import re
 import json
 import torch
 import logging
 import subprocess
-from typing import Dict, Optional
+from typing import Callable, Dict, List, Optional
 from datetime import datetime
 from .model_library import SVCModelLibrary
-from .preprocess import prepare_dataset
-from config import SVC_DIR
+from .preprocess import TrainingCancelled, prepare_dataset
+from .preprocess_manifest import PreprocessManifest, dataset_digest
+from config import SVC_DIR, DATA_LOADER_CONFIG, TRAINING_JOB_CONFIG
 from .feature_extractor import ContentVecExtractor, HubertSoftExtractor
 from torch.cuda.amp import autocast, GradScaler
 from .losses import kl_loss
-from torch.utils.data import DataLoader
-from .models import SynthesizerTrn
+from .data_utils import BucketBatchSampler, DataWaitMeter, create_dataloader, dataset_lengths
+from .synthesizer import SynthesizerTrn
 
 logger = logging.getLogger(__name__)
 
+# 数据预处理进度文件(位于训练目录下)
+PREPROCESS_PROGRESS_FILE = 'preprocess_progress.json'
+
+# 训练日志中的epoch编号
+EPOCH_PATTERN = re.compile(r'Epoch:?\s*(\d+)')
+
 class SVCTrainer:
-    """SVC模型训练器"""
-    def __init__(self):
+    """SVC模型训练器
+    
+    heartbeat(train_dir)在预处理和外部训练命令运行期间定期调用, 用于上报进度;
+    其中抛出TrainingCancelled时终止正在运行的子进程并中止训练。
+    """
+    def __init__(self, heartbeat: Optional[Callable[[str], None]] = None):
         self.model_library = SVCModelLibrary()
         self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+        self.heartbeat = heartbeat
+        
+    def _beat(self, train_dir: str):
+        if self.heartbeat:
+            self.heartbeat(train_dir)
+            
+    def _run(self, cmd: List[str], train_dir: str):
+        """在so-vits-svc目录运行外部命令, 等待期间定期调用heartbeat; 中止时终止子进程"""
+        process = subprocess.Popen(cmd, cwd=SVC_DIR)
+        try:
+            while True:
+                try:
+                    returncode = process.wait(timeout=TRAINING_JOB_CONFIG['poll_seconds'])
+                    break
+                except subprocess.TimeoutExpired:
+                    self._beat(train_dir)
+        except BaseException:
+            process.terminate()
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+            raise
+        if returncode:
+            raise subprocess.CalledProcessError(returncode, cmd)
         
     def prepare_training_data(self, audio_path: str, speaker_name: str) -> str:
         """准备训练数据"""
@@ -37,8 +74,14 @@ class SVCTrainer:
             raw_dir = os.path.join(dataset_dir, speaker_name)
             os.makedirs(raw_dir)
             
-            # 处理音频文件
-            prepare_dataset(audio_path, raw_dir)
+            # 处理音频文件(进度写入训练目录, 供进度接口读取)
+            if not prepare_dataset(
+                audio_path, raw_dir,
+                progress_callback=lambda done, total: self._preprocess_progress(
+                    train_dir, done, total
+                )
+            ):
+                raise RuntimeError(f"Failed to preprocess training audio: {audio_path}")
             
             # 生成配置文件
             config = self._generate_config(train_dir, speaker_name)
@@ -118,24 +161,40 @@ class SVCTrainer:
     def train_model(self, train_dir: str, config: Dict) -> Optional[Dict]:
         """训练模型"""
         try:
-            # 准备环境
-            os.chdir(SVC_DIR)
+            # 外部命令在SVC_DIR中运行, 训练目录使用绝对路径
+            # (不切换工作目录, 模型库等相对路径仍相对于worker的工作目录)
+            train_dir = os.path.abspath(train_dir)
+            dataset_dir = os.path.join(train_dir, "dataset")
             
             # 准备特征提取器
             encoder_type = config.get('encoder_type', 'vec768l12')
             self.encoder = self._prepare_encoder(encoder_type)
             
-            # 预处理数据
-            subprocess.run([
-                "python", "preprocess_flist_config.py",
-                "--speech_encoder", encoder_type
-            ], check=True)
+            # 预处理数据: 数据集片段和参数与上次成功提取时一致则跳过
+            manifest = PreprocessManifest(dataset_dir)
+            step_digest = dataset_digest(dataset_dir, {
+                'speech_encoder': encoder_type,
+                'f0_predictor': config.get('f0_predictor', 'dio')
+            })
+            if manifest.step_current('hubert_f0', step_digest):
+                logger.info("Dataset unchanged since last feature extraction, skipping preprocess")
+            else:
+                self._run([
+                    "python", "preprocess_flist_config.py",
+                    "--speech_encoder", encoder_type
+                ], train_dir)
+                
+                self._run([
+                    "python", "preprocess_hubert_f0.py",
+                    "--f0_predictor", config.get('f0_predictor', 'dio'),
+                    "--num_processes", str(config.get('num_workers', 4))
+                ], train_dir)
+                
+                manifest.record_step('hubert_f0', step_digest)
+                manifest.save()
             
-            subprocess.run([
-                "python", "preprocess_hubert_f0.py",
-                "--f0_predictor", config.get('f0_predictor', 'dio'),
-                "--num_processes", str(config.get('num_workers', 4))
-            ], check=True)
+            # 训练任务的参数写入配置(外部train.py从config.json读取)
+            self._apply_train_config(train_dir, config)
             
             # 开始训练
             train_cmd = [
@@ -154,7 +213,7 @@ class SVCTrainer:
             if 'batch_size' in config:
                 train_cmd.extend(['--batch_size', str(config['batch_size'])])
                 
-            subprocess.run(train_cmd, check=True)
+            self._run(train_cmd, train_dir)
             
             # 获取训练好的模型
             model_path = os.path.join(train_dir, "logs/44k/G_latest.pth")
@@ -173,16 +232,56 @@ class SVCTrainer:
                 }
             return None
             
+        except TrainingCancelled:
+            raise
         except Exception as e:
             logger.error(f"Training failed: {str(e)}")
             return None
             
+    def _apply_train_config(self, train_dir: str, config: Dict):
+        """把任务指定的epochs、batch_size、learning_rate写入训练目录的config.json"""
+        config_path = os.path.join(train_dir, "config.json")
+        with open(config_path) as f:
+            train_config = json.load(f)
+        for key in ('epochs', 'batch_size', 'learning_rate'):
+            if key in config:
+                train_config['train'][key] = config[key]
+        with open(config_path, 'w') as f:
+            json.dump(train_config, f, indent=2)
+            
+    def _preprocess_progress(self, train_dir: str, done: int, total: int):
+        self._save_preprocess_progress(train_dir, done, total)
+        self._beat(train_dir)
+        
+    def _save_preprocess_progress(self, train_dir: str, done: int, total: int):
+        """记录数据预处理进度"""
+        path = os.path.join(train_dir, PREPROCESS_PROGRESS_FILE)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'done': done, 'total': total}, f)
+        os.replace(tmp_path, path)
+        
+    def _configured_epochs(self, train_dir: str) -> int:
+        """训练配置中的总epoch数(外部训练脚本读取的config.json)"""
+        with open(os.path.join(train_dir, "config.json")) as f:
+            return max(1, int(json.load(f)['train']['epochs']))
+        
     def get_training_progress(self, train_dir: str) -> Dict:
         """获取训练进度"""
         try:
             # 读取日志获取进度
             log_file = os.path.join(train_dir, "logs/44k/train.log")
             if not os.path.exists(log_file):
+                progress_file = os.path.join(train_dir, PREPROCESS_PROGRESS_FILE)
+                if os.path.exists(progress_file):
+                    with open(progress_file) as f:
+                        state = json.load(f)
+                    total = state['total'] or 1
+                    return {
+                        'status': 'preparing',
+                        'progress': int(state['done'] / total * 100),
+                        'message': f"Preprocessing segments {state['done']}/{state['total']}..."
+                    }
                 return {
                     'status': 'preparing',
                     'progress': 0,
@@ -192,15 +291,16 @@ class SVCTrainer:
             with open(log_file) as f:
                 lines = f.readlines()
                 
-            # 解析最后一行获取进度
-            if lines:
-                last_line = lines[-1]
-                if 'Epoch' in last_line:
-                    epoch = int(last_line.split('Epoch')[1].split()[0])
+            # 从最后一条epoch日志获取进度(如"Train Epoch: 12 [40%]")
+            for line in reversed(lines):
+                match = EPOCH_PATTERN.search(line)
+                if match:
+                    epoch = int(match.group(1))
+                    epochs = self._configured_epochs(train_dir)
                     return {
                         'status': 'training',
-                        'progress': min(epoch / 100, 100),  # 假设训练100个epoch
-                        'message': f'Training epoch {epoch}...'
+                        'progress': min(int(epoch / epochs * 100), 100),
+                        'message': f'Training epoch {epoch}/{epochs}...'
                     }
                     
             return {
@@ -218,7 +318,11 @@ class SVCTrainer:
             }
         
     def _train_svc_model(self, train_dir: str, config: Dict):
-        """训练SVC模型"""
+        """进程内训练SVC模型
+        
+        train_model不调用此方法(实际训练由外部train.py完成, 使用其自身的数据加载);
+        DATA_LOADER_CONFIG、分桶采样和数据等待统计只作用于这里。
+        """
         try:
             # 1. 加载配置
             with open(os.path.join(SVC_DIR, "configs/config.json")) as f:
@@ -267,18 +371,37 @@ class SVCTrainer:
                 model_config["data"]
             )
             collate_fn = TextAudioSpeakerCollate()
-            train_loader = DataLoader(
-                train_dataset,
-                batch_size=config["batch_size"],
-                shuffle=True,
-                collate_fn=collate_fn
-            )
+            # 配置了帧数预算时按长度分桶动态组批
+            max_frames = config.get("max_batch_frames", DATA_LOADER_CONFIG['max_batch_frames'])
+            batch_sampler = None
+            if max_frames:
+                lengths = dataset_lengths(train_dataset, model_config["data"]["hop_length"])
+                if lengths is None:
+                    logger.warning(f"max_batch_frames={max_frames} is set but {type(train_dataset).__name__} "
+                                   f"exposes no item lengths, using batch_size={config['batch_size']}")
+                else:
+                    batch_sampler = BucketBatchSampler(lengths, max_frames)
+            if batch_sampler is not None:
+                train_loader = create_dataloader(
+                    train_dataset,
+                    collate_fn=collate_fn,
+                    batch_sampler=batch_sampler
+                )
+            else:
+                train_loader = create_dataloader(
+                    train_dataset,
+                    batch_size=config["batch_size"],
+                    shuffle=True,
+                    collate_fn=collate_fn
+                )
             
             # 6. 训练循环
             epochs = config["epochs"]
+            data_wait = DataWaitMeter()
             for epoch in range(epochs):
                 model.train()
-                for batch_idx, batch in enumerate(train_loader):
+                data_wait.reset()
+                for batch_idx, batch in enumerate(data_wait.wrap(train_loader)):
                     # 获取数据
                     x, x_lengths, spec, spec_lengths, y, y_lengths, speakers = [
                         x.to(self.device) for x in batch
@@ -321,6 +444,10 @@ class SVCTrainer:
                             f"Loss kl: {loss_kl.item():.4f}"
                         )
                         
+                logger.info(f"Epoch {epoch} data wait: {data_wait.summary()}")
+                if batch_sampler is not None:
+                    logger.info(f"Epoch {epoch} padding: {batch_sampler.padding_stats()}")
+                        
                 # 保存检查点
                 if (epoch + 1) % 10 == 0:
                     save_path = os.path.join(
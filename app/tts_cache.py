@@ -0,0 +1,84 @@
+import re
+import hashlib
+import unicodedata
+import numpy as np
+from typing import List, Optional
+from config import TTS_CACHE_CONFIG
+from .feature_cache import FeatureCache
+
+# 句末标点, 标点保留在句子末尾; 英文标点后须有空白(避免切开小数和缩写)
+_SENTENCE_END = re.compile(r'(?<=[.!?;])\s+|(?<=[。！？；])\s*')
+
+def normalize_sentence(sentence: str) -> str:
+    """规范化句子: 全半角统一, 合并空白"""
+    sentence = unicodedata.normalize('NFKC', sentence)
+    return re.sub(r'\s+', ' ', sentence).strip()
+
+def split_sentences(text: str) -> List[str]:
+    """把文本切分为规范化的句子"""
+    # 先切分再规范化: NFKC会把全角标点转为半角
+    return [s for s in (normalize_sentence(p) for p in _SENTENCE_END.split(text.strip())) if s]
+
+def crossfade_concat(pieces: List[np.ndarray], fade_samples: int) -> np.ndarray:
+    """拼接音频片段, 相邻片段重叠fade_samples个样本做等功率交叉淡化"""
+    if not pieces:
+        return np.zeros(0, dtype=np.float32)
+    out = np.asarray(pieces[0], dtype=np.float32)
+    for piece in pieces[1:]:
+        piece = np.asarray(piece, dtype=np.float32)
+        n = min(fade_samples, len(out), len(piece))
+        if n == 0:
+            out = np.concatenate([out, piece])
+            continue
+        t = np.linspace(0, np.pi / 2, n, dtype=np.float32)
+        overlap = out[-n:] * np.cos(t) + piece[:n] * np.sin(t)
+        out = np.concatenate([out[:-n], overlap, piece[n:]])
+    return out
+
+class TTSSegmentCache(FeatureCache):
+    """句子级TTS片段缓存
+
+    以(规范化句子, 模型, 语速, 音高)为键, 音频以fp16 .npy保存并按最近访问时间淘汰;
+    命中时按未命中句子的平均合成速度估算节省的合成时间。
+    """
+    def __init__(self, cache_dir: Optional[str] = None,
+                 max_size_mb: Optional[int] = None):
+        super().__init__(
+            cache_dir or TTS_CACHE_CONFIG['cache_dir'],
+            max_size_mb or TTS_CACHE_CONFIG['max_size_mb']
+        )
+        self.enabled = TTS_CACHE_CONFIG['enabled']
+        self.synthesis_seconds = 0.0  # 未命中句子的合成耗时
+        self.synthesized_audio = 0.0  # 未命中句子的音频时长
+        self.cached_audio = 0.0       # 命中句子的音频时长
+
+    def segment_key(self, sentence: str, model_name: str,
+                    speed: float, pitch: float) -> str:
+        """生成片段缓存键"""
+        raw = f"{normalize_sentence(sentence)}\x00{model_name}\x00{float(speed):g}\x00{float(pitch):g}"
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def record_hit(self, audio_seconds: float):
+        self.hits += 1
+        self.cached_audio += audio_seconds
+
+    def record_miss(self, synthesis_seconds: float, audio_seconds: float):
+        self.misses += 1
+        self.synthesis_seconds += synthesis_seconds
+        self.synthesized_audio += audio_seconds
+
+    def stats(self) -> dict:
+        """命中率与估算节省的合成时间(秒)"""
+        stats = super().stats()
+        rtf = self.synthesis_seconds / self.synthesized_audio if self.synthesized_audio else 0.0
+        stats['saved_seconds'] = round(self.cached_audio * rtf, 2)
+        return stats
+
+_tts_cache = None
+
+def get_tts_cache() -> TTSSegmentCache:
+    """获取进程内共享的TTS片段缓存"""
+    global _tts_cache
+    if _tts_cache is None:
+        _tts_cache = TTSSegmentCache()
+    return _tts_cache
@@ -0,0 +1,142 @@
+import time
+import queue
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, Optional
+from config import TTS_MODEL_NAME, TTS_POOL_CONFIG
+
+logger = logging.getLogger(__name__)
+
+def load_tts(model_name: str):
+    """加载TTS模型(延迟导入, Web进程不需要加载TTS)"""
+    from TTS.api import TTS
+    engine = TTS(model_name)
+    logger.info(f"TTS model {model_name} initialized")
+    return engine
+
+def validate_tts_model(model_name: Optional[str]) -> Optional[str]:
+    """检查客户端指定的TTS模型, 只允许TTS_MODEL_NAME和TTS_POOL_CONFIG['models']; 空值表示默认模型"""
+    if not model_name:
+        return None
+    if model_name != TTS_MODEL_NAME and model_name not in TTS_POOL_CONFIG['models']:
+        raise ValueError(f"Unsupported TTS model: {model_name}")
+    return model_name
+
+class TTSEnginePool:
+    """TTS引擎池
+
+    每个模型名称最多保持size个已加载实例, 线程通过checkout/checkin借用,
+    同一实例同一时间只被一个线程使用; 实例不足时等待其他线程归还。
+    """
+    def __init__(self, size: Optional[int] = None, factory=load_tts):
+        self.size = max(1, size or TTS_POOL_CONFIG['size'])
+        self._factory = factory
+        self._idle: Dict[str, queue.Queue] = {}
+        self._created: Dict[str, int] = {}
+        self._metrics: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, model_name: str) -> queue.Queue:
+        with self._lock:
+            if model_name not in self._idle:
+                self._idle[model_name] = queue.Queue()
+                self._created[model_name] = 0
+                self._metrics[model_name] = {
+                    'checkouts': 0,
+                    'wait_seconds': 0.0,
+                    'busy_seconds': 0.0,
+                    'since': time.perf_counter()
+                }
+            return self._idle[model_name]
+
+    def _create(self, model_name: str) -> bool:
+        """占用一个新实例名额, 已满时返回False"""
+        with self._lock:
+            if self._created[model_name] >= self.size:
+                return False
+            self._created[model_name] += 1
+            return True
+
+    def _build(self, model_name: str):
+        try:
+            return self._factory(model_name)
+        except Exception:
+            with self._lock:
+                self._created[model_name] -= 1
+            raise
+
+    def warm(self, model_names: Optional[Iterable[str]] = None):
+        """预先加载每个模型的全部实例"""
+        for model_name in model_names or TTS_POOL_CONFIG['models']:
+            idle = self._register(model_name)
+            while self._create(model_name):
+                idle.put(self._build(model_name))
+            logger.info(f"Warmed {self.size} TTS instance(s) of {model_name}")
+
+    def checkout(self, model_name: Optional[str] = None, timeout: Optional[float] = None):
+        """借出一个实例: 优先使用空闲实例, 未达上限时新建, 否则等待归还"""
+        model_name = model_name or TTS_MODEL_NAME
+        idle = self._register(model_name)
+        start = time.perf_counter()
+        try:
+            engine = idle.get_nowait()
+        except queue.Empty:
+            if self._create(model_name):
+                engine = self._build(model_name)
+            else:
+                try:
+                    engine = idle.get(timeout=timeout)
+                except queue.Empty:
+                    raise TimeoutError(f"No idle TTS instance of {model_name}")
+
+        with self._lock:
+            metrics = self._metrics[model_name]
+            metrics['checkouts'] += 1
+            metrics['wait_seconds'] += time.perf_counter() - start
+        return engine
+
+    def checkin(self, model_name: Optional[str], engine, busy_seconds: float = 0.0):
+        """归还实例"""
+        model_name = model_name or TTS_MODEL_NAME
+        with self._lock:
+            self._metrics[model_name]['busy_seconds'] += busy_seconds
+        self._idle[model_name].put(engine)
+
+    @contextmanager
+    def engine(self, model_name: Optional[str] = None, timeout: Optional[float] = None):
+        """with语句中借用实例, 退出时自动归还"""
+        engine = self.checkout(model_name, timeout)
+        start = time.perf_counter()
+        try:
+            yield engine
+        finally:
+            self.checkin(model_name, engine, time.perf_counter() - start)
+
+    def stats(self) -> Dict[str, Dict]:
+        """各模型的实例数、借用次数、等待时间和利用率"""
+        now = time.perf_counter()
+        report = {}
+        with self._lock:
+            for model_name, metrics in self._metrics.items():
+                created = self._created[model_name]
+                idle = self._idle[model_name].qsize()
+                capacity = created * (now - metrics['since'])
+                report[model_name] = {
+                    'instances': created,
+                    'in_use': created - idle,
+                    'checkouts': metrics['checkouts'],
+                    'wait_seconds': round(metrics['wait_seconds'], 3),
+                    'busy_seconds': round(metrics['busy_seconds'], 3),
+                    'utilization': metrics['busy_seconds'] / capacity if capacity else 0.0
+                }
+        return report
+
+_tts_pool = None
+
+def get_tts_pool() -> TTSEnginePool:
+    """获取进程内共享的TTS引擎池"""
+    global _tts_pool
+    if _tts_pool is None:
+        _tts_pool = TTSEnginePool()
+    return _tts_pool
@@ -1,36 +1,29 @@
 import os
-from TTS.api import TTS
 import subprocess
 import uuid
+import time
 import logging
 from config import (
     TTS_MODEL_NAME, TTS_OUTPUT_DIR, 
     SVC_MODEL_PATH, SVC_CONFIG_PATH, SVC_OUTPUT_DIR,
     SVC_DIR, AUDIO_SAMPLE_RATE, AUDIO_CHANNELS,
-    HUBERT_MODEL_PATH, SVC_INFERENCE_CONFIG
+    HUBERT_CONFIG, SVC_INFERENCE_CONFIG, TTS_CACHE_CONFIG
 )
+from .model_manager import read_checkpoint_header
+from .tts_pool import get_tts_pool
 
 # 配置日志
 logger = logging.getLogger(__name__)
 
-# 全局TTS实例
-tts = None
-
 # 在文件开头添加
 MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
 
-def init_tts():
-    """初始化TTS实例"""
-    global tts
-    try:
-        tts = TTS(TTS_MODEL_NAME)
-        logger.info("TTS initialized successfully")
-    except Exception as e:
-        logger.error(f"Failed to initialize TTS: {str(e)}")
-        raise
+def setup_svc(check_device: bool = False):
+    """检查并设置so-vits-svc环境
 
-def setup_svc():
-    """检查并设置so-vits-svc环境"""
+    只读取checkpoint文件头验证格式, 不加载权重; check_device为True时
+    (推理worker)才导入torch检查CUDA。
+    """
     if not os.path.exists(SVC_DIR):
         raise RuntimeError(f"SVC directory not found at {SVC_DIR}")
     
@@ -38,7 +31,7 @@ def setup_svc():
     required_files = {
         'SVC model': SVC_MODEL_PATH,
         'SVC config': SVC_CONFIG_PATH,
-        'Hubert model': HUBERT_MODEL_PATH
+        'Hubert model': HUBERT_CONFIG['model_path']
     }
     
     for name, path in required_files.items():
@@ -47,19 +40,19 @@ def setup_svc():
     
     # 验证模型文件
     try:
-        import torch
         # 检查hubert模型
-        hubert = torch.load(HUBERT_MODEL_PATH, map_location='cpu')
+        hubert = read_checkpoint_header(HUBERT_CONFIG['model_path'])
         if not isinstance(hubert, dict) or 'model' not in hubert:
             raise RuntimeError("Invalid hubert model file")
             
         # 检查SVC模型
-        svc_model = torch.load(SVC_MODEL_PATH, map_location='cpu')
+        svc_model = read_checkpoint_header(SVC_MODEL_PATH)
         if not isinstance(svc_model, dict):
             raise RuntimeError("Invalid SVC model file")
             
         # 检查CUDA
-        if SVC_INFERENCE_CONFIG['device'].startswith('cuda'):
+        if check_device and SVC_INFERENCE_CONFIG['device'].startswith('cuda'):
+            import torch
             if not torch.cuda.is_available():
                 raise RuntimeError("CUDA is not available")
             logger.info(f"CUDA is available: {torch.cuda.get_device_name(0)}")
@@ -108,6 +101,8 @@ def get_safe_filename(filename):
 
 def convert_audio_format(input_path, output_format='wav'):
     """转换音频格式"""
+    import librosa
+    import soundfile as sf
     try:
         # 读取音频
         y, sr = librosa.load(input_path, sr=AUDIO_SAMPLE_RATE, mono=True)
@@ -123,43 +118,108 @@ def convert_audio_format(input_path, output_format='wav'):
         logger.error(f"Audio format conversion failed: {str(e)}")
         raise
 
-def generate_tts(text, pitch, speed):
-    """生成TTS音频"""
-    global tts
-    if tts is None:
-        init_tts()
+def generate_tts(text, pitch, speed, model_name=None):
+    """生成TTS音频(model_name为空时使用TTS_MODEL_NAME)
+    
+    开启片段缓存时按句合成, 已缓存的句子直接复用。
+    """
+    from .tts_cache import get_tts_cache
+    cache = get_tts_cache()
+    if cache.enabled:
+        return _generate_segmented(text, pitch, speed, model_name or TTS_MODEL_NAME, cache)
+    return _render_tts(text, pitch, speed, model_name)
+
+def _generate_segmented(text, pitch, speed, model_name, cache):
+    """按句合成并拼接, 只合成未缓存的句子"""
+    import numpy as np
+    import soundfile as sf
+    from .tts_cache import split_sentences, crossfade_concat
+    
+    sentences = split_sentences(text)
+    if not sentences:
+        return _render_tts(text, pitch, speed, model_name)
+        
+    pieces = []
+    for sentence in sentences:
+        key = cache.segment_key(sentence, model_name, speed, pitch)
+        audio = cache.get(key)
+        if audio is not None:
+            cache.record_hit(len(audio) / AUDIO_SAMPLE_RATE)
+        else:
+            start = time.perf_counter()
+            path = _render_tts(sentence, pitch, speed, model_name)
+            try:
+                audio, _ = sf.read(path, dtype='float32')
+            finally:
+                cleanup_files(path)
+            cache.record_miss(time.perf_counter() - start, len(audio) / AUDIO_SAMPLE_RATE)
+            audio = cache.put(key, audio)
+        pieces.append(np.asarray(audio, dtype=np.float32))
+        
+    fade = int(TTS_CACHE_CONFIG['crossfade_ms'] / 1000 * AUDIO_SAMPLE_RATE)
+    final_path = os.path.join(TTS_OUTPUT_DIR, f"tts_{uuid.uuid4().hex}.wav")
+    try:
+        sf.write(final_path, crossfade_concat(pieces, fade), AUDIO_SAMPLE_RATE)
+        check_file_size(final_path)
+        validate_audio_file(final_path)
+    except Exception as e:
+        logger.error(f"TTS generation failed: {str(e)}")
+        cleanup_files(final_path)
+        raise
         
+    logger.info(f"TTS rendered {len(sentences)} sentence(s), segment cache: {cache.stats()}")
+    return final_path
+
+def _render_tts(text, pitch, speed, model_name=None):
+    """用引擎池合成一段文本, 输出转换为AUDIO_SAMPLE_RATE单声道wav"""
     try:
         unique_id = uuid.uuid4().hex
         temp_path = os.path.join(TTS_OUTPUT_DIR, f"temp_{unique_id}.wav")
         final_path = os.path.join(TTS_OUTPUT_DIR, f"tts_{unique_id}.wav")
         
-        # 生成音频
-        tts.tts_to_file(
-            text=text,
-            file_path=temp_path,
-            speed=speed,
-            pitch=pitch
-        )
+        # 从引擎池借用实例生成音频
+        with get_tts_pool().engine(model_name) as tts:
+            tts.tts_to_file(
+                text=text,
+                file_path=temp_path,
+                speed=speed,
+                pitch=pitch
+            )
         
         # 验证临时文件
         if not os.path.exists(temp_path):
             raise Exception("TTS failed to generate audio file")
             
-        # 转换格式并验证
-        final_path = convert_audio_format(temp_path)
+        # 转换格式(格式相同时转换结果会覆盖临时文件本身), 以最终文件名保存后验证
+        converted_path = convert_audio_format(temp_path)
+        os.replace(converted_path, final_path)
+        if converted_path != temp_path:
+            cleanup_files(temp_path)
         check_file_size(final_path)
         validate_audio_file(final_path)
         
-        # 清理临时文件
-        cleanup_files(temp_path)
-        
         return final_path
     except Exception as e:
         logger.error(f"TTS generation failed: {str(e)}")
         cleanup_files(temp_path, final_path)
         raise
 
+def time_stretch_tts(tts_path, speed):
+    """对原速TTS音频做WSOLA变速, 生成指定语速的TTS文件"""
+    import soundfile as sf
+    from .time_stretch import wsola
+    
+    audio, sr = sf.read(tts_path, dtype='float32')
+    output_path = os.path.join(TTS_OUTPUT_DIR, f"tts_{uuid.uuid4().hex}.wav")
+    try:
+        sf.write(output_path, wsola(audio, speed, sr), sr)
+        validate_audio_file(output_path)
+        return output_path
+    except Exception as e:
+        logger.error(f"TTS time stretch failed: {str(e)}")
+        cleanup_files(output_path)
+        raise
+
 def apply_svc(tts_path, melody):
     """应用SVC转换"""
     try:
@@ -215,6 +275,16 @@ def apply_svc(tts_path, melody):
         logger.error(f"SVC processing failed: {str(e)}")
         raise
 
+def is_valid_artifact(file_path) -> bool:
+    """检查阶段产物是否可复用(存在且为可读取的非空音频)"""
+    if not file_path or not os.path.exists(file_path):
+        return False
+    try:
+        import soundfile as sf
+        return sf.info(file_path).frames > 0
+    except Exception:
+        return False
+
 def cleanup_files(*file_paths):
     """清理临时文件"""
     for path in file_paths:
@@ -0,0 +1,117 @@
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+from config import WORKER_CONFIG
+from .model_library import SVCModelLibrary
+
+logger = logging.getLogger(__name__)
+
+def module_memory_bytes(module) -> int:
+    """估算模型权重占用的内存(包括量化后的打包权重)"""
+    def tensor_bytes(value) -> int:
+        if isinstance(value, (tuple, list)):
+            return sum(tensor_bytes(v) for v in value)
+        if hasattr(value, 'element_size'):
+            return value.numel() * value.element_size()
+        return 0
+    return sum(tensor_bytes(v) for v in module.state_dict().values())
+
+class VoiceModelCache:
+    """已加载音色模型的LRU缓存
+
+    按melody/模型名称缓存推理器, 总权重超过内存预算时淘汰最久未使用的模型
+    (至少保留一个); 内容编码器与音色无关, 所有音色共用一个实例。
+    预算只计各音色模型(inferencer.model)的权重, 共用的HuBERT(常驻, 约数百MB)
+    和F0预测器等无权重的状态不计入; 同一音色并发请求时只加载一次。
+    """
+    def __init__(self, max_size_mb: Optional[int] = None,
+                 device: Optional[str] = None):
+        self.max_bytes = (max_size_mb or WORKER_CONFIG['voice_cache_mb']) * 1024 * 1024
+        self.device = device
+        self.library = SVCModelLibrary()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.load_seconds: Dict[str, float] = {}
+        self._models = OrderedDict()  # name -> (inferencer, bytes)
+        self._loading: Dict[str, threading.Lock] = {}  # 正在加载的音色 -> 加载锁
+        self._lock = threading.Lock()
+
+    def get(self, melody: Optional[str] = None):
+        """获取音色对应的推理器, 未加载时按模型库解析路径并加载"""
+        name = melody or 'default'
+        with self._lock:
+            if name in self._models:
+                self._models.move_to_end(name)
+                self.hits += 1
+                return self._models[name][0]
+            load_lock = self._loading.setdefault(name, threading.Lock())
+
+        # 同一音色的并发请求等待第一个加载完成
+        try:
+            with load_lock:
+                with self._lock:
+                    if name in self._models:
+                        self._models.move_to_end(name)
+                        self.hits += 1
+                        return self._models[name][0]
+                    self.misses += 1
+                    hubert = self._shared_hubert()
+                return self._load(name, hubert)
+        finally:
+            with self._lock:
+                if self._loading.get(name) is load_lock:
+                    del self._loading[name]
+
+    def _load(self, name: str, hubert):
+        from .inference import SVCInference
+        model = self.library.resolve_model(name)
+        start = time.perf_counter()
+        inferencer = SVCInference(
+            model['path'], model['config_path'],
+            device=self.device, hubert=hubert
+        )
+        elapsed = time.perf_counter() - start
+
+        size = self.put(name, inferencer)
+        self.load_seconds[name] = elapsed
+        logger.info(f"Loaded voice model {name} in {elapsed:.2f}s "
+                    f"({size / 1024 / 1024:.1f}MB), cache: {self.stats()}")
+        return inferencer
+
+    def put(self, name: str, inferencer) -> int:
+        """放入已加载的推理器(如父进程预加载的默认模型), 返回估算字节数"""
+        size = module_memory_bytes(inferencer.model)
+        with self._lock:
+            self._models[name] = (inferencer, size)
+            self._models.move_to_end(name)
+            self._evict()
+        return size
+
+    def _shared_hubert(self):
+        for inferencer, _ in self._models.values():
+            return inferencer.hubert
+        return None
+
+    def _evict(self):
+        total = sum(size for _, size in self._models.values())
+        while total > self.max_bytes and len(self._models) > 1:
+            name, (_, size) = self._models.popitem(last=False)
+            total -= size
+            self.evictions += 1
+            logger.info(f"Evicted voice model {name} ({size / 1024 / 1024:.1f}MB)")
+
+    def stats(self) -> Dict:
+        """缓存命中与加载耗时统计"""
+        total = self.hits + self.misses
+        return {
+            'models': list(self._models.keys()),
+            'memory_mb': round(sum(s for _, s in self._models.values()) / 1024 / 1024, 1),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / total if total else 0.0,
+            'load_seconds': {k: round(v, 3) for k, v in self.load_seconds.items()}
+        }
@@ -0,0 +1,143 @@
+import os
+import logging
+from typing import Dict, Iterable, List, Optional
+from celery.signals import worker_init, worker_process_init
+from config import WORKER_CONFIG, TTS_POOL_CONFIG, SVC_MODEL_PATH, SVC_CONFIG_PATH
+
+logger = logging.getLogger(__name__)
+
+# 音色模型缓存(预加载时由父进程创建, fork后子进程共享已加载的模型)
+_voice_cache = None
+
+# worker并发数(父进程记录, fork后子进程用于计算CPU分配)
+_concurrency = None
+
+def share_module_memory(module) -> int:
+    """将模块的参数和缓冲区移到共享内存, 返回字节数"""
+    total = 0
+    for tensor in list(module.parameters()) + list(module.buffers()):
+        tensor.share_memory_()
+        total += tensor.numel() * tensor.element_size()
+    return total
+
+def preload_models():
+    """在父进程加载SynthesizerTrn和内容编码器并放入共享内存
+
+    只支持CPU推理: CUDA上下文不能跨fork使用。
+    """
+    global _voice_cache
+    from .inference import SVCInference
+    from .voice_cache import VoiceModelCache
+
+    inferencer = SVCInference(SVC_MODEL_PATH, SVC_CONFIG_PATH, device='cpu')
+    shared = share_module_memory(inferencer.model) + share_module_memory(inferencer.hubert)
+    _voice_cache = VoiceModelCache(device='cpu')
+    _voice_cache.put('default', inferencer)
+    logger.info(f"Preloaded models in worker parent {os.getpid()}, "
+                f"{shared / 1024 / 1024:.1f}MB in shared memory")
+
+def get_voice_cache():
+    """获取进程内的音色模型缓存"""
+    global _voice_cache
+    if _voice_cache is None:
+        from .voice_cache import VoiceModelCache
+        _voice_cache = VoiceModelCache()
+    return _voice_cache
+
+def get_inference(melody: Optional[str] = None):
+    """获取音色对应的推理器: 优先使用缓存中已加载(或父进程预加载)的实例"""
+    return get_voice_cache().get(melody)
+
+def memory_report() -> Dict[str, float]:
+    """当前进程内存占用(MB): rss为总驻留, uss为进程独占, pss按共享进程数分摊"""
+    import psutil
+    proc = psutil.Process(os.getpid())
+    try:
+        info = proc.memory_full_info()
+    except (psutil.AccessDenied, AttributeError):
+        info = proc.memory_info()
+    report = {'pid': proc.pid}
+    for field in ('rss', 'uss', 'pss', 'shared'):
+        value = getattr(info, field, None)
+        if value is not None:
+            report[field] = round(value / 1024 / 1024, 1)
+    return report
+
+def available_cores() -> List[int]:
+    """当前进程可用的CPU核心(受monitor.yml中celery的cpu_affinity限制)"""
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+def plan_cpu_layout(n_workers: int, cores: Optional[Iterable[int]] = None) -> List[List[int]]:
+    """把核心平均分给n_workers个子进程, 余数分给前几个; 子进程多于核心时轮流共用"""
+    cores = list(cores) if cores is not None else available_cores()
+    if n_workers >= len(cores):
+        return [[cores[i % len(cores)]] for i in range(n_workers)]
+        
+    base, extra = divmod(len(cores), n_workers)
+    layout = []
+    start = 0
+    for i in range(n_workers):
+        size = base + (1 if i < extra else 0)
+        layout.append(cores[start:start + size])
+        start += size
+    return layout
+
+def apply_cpu_placement(cores: List[int], interop_threads: Optional[int] = None):
+    """绑定当前进程到指定核心, 并让torch线程数与核心数一致"""
+    import psutil
+    import torch
+    from scripts.process_utils import set_cpu_affinity
+    
+    set_cpu_affinity(psutil.Process(), cores)
+    torch.set_num_threads(len(cores))
+    if interop_threads is None:
+        interop_threads = WORKER_CONFIG['interop_threads']
+    try:
+        torch.set_num_interop_threads(interop_threads)
+    except RuntimeError as e:
+        # 已有inter-op并行任务运行后不能再修改
+        logger.warning(f"Failed to set interop threads: {str(e)}")
+    logger.info(f"Worker process {os.getpid()} pinned to cores {cores}, "
+                f"torch threads {len(cores)}")
+
+@worker_init.connect
+def init_worker(sender=None, **kwargs):
+    """worker父进程启动(fork子进程之前)"""
+    global _concurrency
+    _concurrency = getattr(sender, 'concurrency', None)
+    
+    if WORKER_CONFIG['preload_models']:
+        try:
+            preload_models()
+        except Exception as e:
+            logger.error(f"Failed to preload models: {str(e)}")
+
+@worker_process_init.connect
+def init_worker_process(**kwargs):
+    """worker子进程启动时加载推理依赖(Web进程不导入torch/TTS)"""
+    from .utils import setup_svc
+    
+    # 按子进程序号分配CPU核心
+    if WORKER_CONFIG['cpu_pinning'] and _concurrency:
+        from billiard.process import current_process
+        index = getattr(current_process(), 'index', 0) or 0
+        try:
+            apply_cpu_placement(plan_cpu_layout(_concurrency)[index % _concurrency])
+        except Exception as e:
+            logger.error(f"Failed to apply CPU placement: {str(e)}")
+            
+    try:
+        from . import inference
+        setup_svc(check_device=True)
+    except Exception as e:
+        logger.error(f"Worker environment check failed: {str(e)}")
+        
+    if TTS_POOL_CONFIG['warm']:
+        from .tts_pool import get_tts_pool
+        try:
+            get_tts_pool().warm()
+        except Exception as e:
+            logger.error(f"Failed to warm TTS pool: {str(e)}")
+    logger.info(f"Worker process memory: {memory_report()}")
@@ -101,6 +101,18 @@ MAX_AUDIO_SIZE = 50 * 1024 * 1024  # 50MB
 AUDIO_SAMPLE_RATE = 44100
 AUDIO_CHANNELS = 1 
 
+# 频谱参数(预处理、数据集和mel损失共用, 修改后需重新预处理)
+SPECTRAL_CONFIG = {
+    'n_fft': 2048,
+    'hop_length': 512,
+    'win_length': 2048,
+    'n_mels': 80,
+    'fmin': 0.0,
+    'fmax': None,
+    # 不居中分帧(与so-vits-svc预处理一致), 帧数为1 + (T - n_fft) // hop_length
+    'center': False
+}
+
 # 音频转换配置
 AUDIO_FORMATS = {
     'input': ['wav', 'mp3', 'flac'],
@@ -113,7 +125,10 @@ HUBERT_CONFIG = {
     'download_url': 'https://github.com/bshall/hubert/releases/download/v0.1/hubert-soft-0d54a1f4.pt',
     'device': os.getenv('SVC_DEVICE', 'cuda:0'),
     'sample_rate': 16000,
-    'hop_length': 320
+    'hop_length': 320,
+    'chunk_size': 160000,  # 长音频分块长度(采样点)
+    'chunk_overlap': int(os.getenv('HUBERT_CHUNK_OVERLAP', 8000)),  # 块两侧上下文(采样点)
+    'max_batch_samples': int(os.getenv('HUBERT_MAX_BATCH_SAMPLES', 16000 * 120))  # 单次前向的采样点上限
 }
 
 # SVC推理配置
@@ -123,7 +138,110 @@ SVC_INFERENCE_CONFIG = {
     'speaker_id': int(os.getenv('SVC_SPEAKER_ID', 0)),
     'noise_scale': float(os.getenv('SVC_NOISE_SCALE', 0.4)),
     'f0_method': os.getenv('SVC_F0_METHOD', 'dio'),
-    'device': os.getenv('SVC_DEVICE', 'cuda:0')
+    'device': os.getenv('SVC_DEVICE', 'cuda:0'),
+    # 推理优化: 去掉后验编码器并折叠weight norm
+    'optimize': os.getenv('SVC_OPTIMIZE_INFERENCE', 'true').lower() == 'true',
+    # CPU上trace并冻结推理路径(冻结后权重成为常量, 不能与SVC_PRELOAD_MODELS共享内存)
+    'trace': os.getenv('SVC_TRACE_INFERENCE', 'false').lower() == 'true',
+    # CPU推理时对Linear层做动态int8量化, 量化权重缓存在checkpoint旁(*.int8.pth)
+    'quantize': os.getenv('SVC_QUANTIZE', 'false').lower() == 'true',
+    # 同一音频多个音高/说话人变体一次送入生成器的最大数量
+    'variant_batch_size': int(os.getenv('SVC_VARIANT_BATCH_SIZE', 4)),
+    # 静音门控: 只转换非静音区间, 静音按原位置补零
+    'vad': os.getenv('SVC_VAD', 'false').lower() == 'true',
+    'vad_top_db': float(os.getenv('SVC_VAD_TOP_DB', 40)),
+    'vad_pad_seconds': float(os.getenv('SVC_VAD_PAD_SECONDS', 0.1)),  # 区间两侧保留的上下文
+    'vad_min_silence': float(os.getenv('SVC_VAD_MIN_SILENCE', 0.3))  # 短于该时长的静音不切分
+}
+
+# F0分块并行提取配置
+F0_PARALLEL_CONFIG = {
+    # 默认关闭: 在线推理的F0提取在worker子进程中进行, 实测分块并行没有明显收益
+    'enabled': os.getenv('F0_PARALLEL', 'false').lower() == 'true',
+    'num_workers': int(os.getenv('F0_NUM_WORKERS', os.cpu_count() or 1)),
+    'chunk_seconds': float(os.getenv('F0_CHUNK_SECONDS', 20.0)),  # 每块时长(秒)
+    'overlap_seconds': float(os.getenv('F0_OVERLAP_SECONDS', 1.0)),  # 单侧重叠时长(秒)
+    'min_duration': float(os.getenv('F0_PARALLEL_MIN_DURATION', 60.0))  # 超过该时长才分块
+}
+
+# TTS引擎池配置
+TTS_POOL_CONFIG = {
+    'size': int(os.getenv('TTS_POOL_SIZE', 1)),  # 每个模型的实例数
+    # worker子进程启动时预加载的模型(逗号分隔)
+    'models': [m.strip() for m in os.getenv('TTS_POOL_MODELS', TTS_MODEL_NAME).split(',') if m.strip()],
+    'warm': os.getenv('TTS_POOL_WARM', 'true').lower() == 'true'
+}
+
+# 语速变体复用配置: 同一文本只合成一次原速TTS, 其他语速用WSOLA变速得到
+TIME_STRETCH_CONFIG = {
+    'enabled': os.getenv('TTS_TIME_STRETCH', 'false').lower() == 'true',
+    # 超出该范围时变速音质下降明显, 回退为重新合成
+    'min_rate': float(os.getenv('TTS_TIME_STRETCH_MIN', 0.8)),
+    'max_rate': float(os.getenv('TTS_TIME_STRETCH_MAX', 1.25))
+}
+
+# 训练数据预处理配置
+PREPROCESS_CONFIG = {
+    'num_workers': int(os.getenv('PREPROCESS_WORKERS', os.cpu_count() or 1)),  # 片段处理进程数
+    'stream_min_seconds': float(os.getenv('PREPROCESS_STREAM_MIN_SECONDS', 600)),  # 超过该时长的录音按块流式切分, 0表示总是流式
+    'stream_block_seconds': float(os.getenv('PREPROCESS_STREAM_BLOCK_SECONDS', 30))  # 流式读取的块长
+}
+
+# 打包训练特征配置: 音频/mel/F0各存一个连续文件, SVCDataset以内存映射读取
+FEATURE_STORE_CONFIG = {
+    'pack': os.getenv('PACK_FEATURES', 'true').lower() == 'true',  # 预处理后自动打包
+    'dir_name': 'packed',  # 数据集目录下的打包目录名
+    'shard_size': int(os.getenv('FEATURE_SHARD_SIZE', 4096))  # 每个分片的片段数
+}
+
+# 训练数据加载配置
+# 只作用于本仓库的数据加载(SVCDataset.get_batch和进程内训练器SVCTrainer._train_svc_model);
+# 训练任务(run_training_job)运行外部so-vits-svc的train.py, 使用其自身的DataLoader, 不读取这些配置
+DATA_LOADER_CONFIG = {
+    'num_workers': int(os.getenv('DATALOADER_WORKERS', min(4, os.cpu_count() or 1))),  # 0表示在主进程加载
+    'prefetch_factor': int(os.getenv('DATALOADER_PREFETCH', 2)),  # 每个worker预取的批次数
+    # 把打包特征读入各DataLoader worker共享的内存, 超出预算的分片仍按内存映射读取, 0表示关闭
+    'ram_cache_mb': int(os.getenv('DATASET_RAM_CACHE_MB', 0)),
+    # 按长度分桶组批: 每批(最长项帧数×项数)不超过该值, 0表示按固定batch_size组批
+    # (同样不作用于训练任务: 外部train.py按config.json的batch_size组批)
+    'max_batch_frames': int(os.getenv('BATCH_MAX_FRAMES', 0)),
+    'bucket_pool_size': int(os.getenv('BUCKET_POOL_SIZE', 2048))  # 每次排序分桶的片段数, 越大补零越少、随机性越低
+}
+
+# 后台训练任务配置: 训练在独立队列上由单独的worker执行, 不占用Web进程和合成worker
+TRAINING_JOB_CONFIG = {
+    'queue': os.getenv('TRAINING_QUEUE', 'training'),
+    'time_limit': int(os.getenv('TRAINING_TIME_LIMIT', 48 * 3600)),  # 单个训练任务的最长时间(秒)
+    'poll_seconds': float(os.getenv('TRAINING_POLL_SECONDS', 10)),  # 进度上报和取消检查的间隔
+    'train_dir': os.getenv('TRAINING_DIR', os.path.join(DATA_DIR, 'training'))  # 各训练任务的工作目录
+}
+
+# Celery worker配置
+WORKER_CONFIG = {
+    # 在父进程预加载模型并放入共享内存, prefork子进程共享同一份权重(仅CPU推理)
+    'preload_models': os.getenv('SVC_PRELOAD_MODELS', 'false').lower() == 'true',
+    # 把可用核心平均分给各子进程并绑定, torch线程数等于分到的核心数
+    'cpu_pinning': os.getenv('SVC_CPU_PINNING', 'true').lower() == 'true',
+    'interop_threads': int(os.getenv('SVC_INTEROP_THREADS', 1)),
+    # 每个子进程缓存的音色模型权重上限(MB), 超出时按LRU淘汰
+    'voice_cache_mb': int(os.getenv('SVC_VOICE_CACHE_MB', 2048)),
+    # 批量任务中TTS与SVC之间队列的长度(TTS最多领先的组数)
+    'pipeline_depth': int(os.getenv('SVC_PIPELINE_DEPTH', 2))
+}
+
+# 内容特征缓存配置
+FEATURE_CACHE_CONFIG = {
+    'enabled': os.getenv('FEATURE_CACHE_ENABLED', 'true').lower() == 'true',
+    'cache_dir': os.getenv('FEATURE_CACHE_DIR', os.path.join(DATA_DIR, 'feature_cache')),
+    'max_size_mb': int(os.getenv('FEATURE_CACHE_MAX_MB', 4096))
+}
+
+# 句子级TTS片段缓存配置: 文本按句切分, 已合成过的句子直接复用
+TTS_CACHE_CONFIG = {
+    'enabled': os.getenv('TTS_SEGMENT_CACHE', 'false').lower() == 'true',
+    'cache_dir': os.getenv('TTS_CACHE_DIR', os.path.join(DATA_DIR, 'tts_cache')),
+    'max_size_mb': int(os.getenv('TTS_CACHE_MAX_MB', 2048)),
+    'crossfade_ms': float(os.getenv('TTS_CROSSFADE_MS', 10))  # 句子之间的交叉淡化时长
 }
 
 # 数据库备份配置
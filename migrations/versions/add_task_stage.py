@@ -0,0 +1,27 @@
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = '2b3c4d5e6f7a'
+down_revision = '1a2b3c4d5e6f'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # 任务阶段状态, 重试时从第一个未完成阶段继续
+    op.add_column(
+        'task',
+        sa.Column('stage', sa.String(20), server_default='pending')
+    )
+    
+    # 已有任务按产物推断阶段
+    op.execute("UPDATE task SET stage = 'svc_done' WHERE status = 'Completed'")
+    op.execute(
+        "UPDATE task SET stage = 'tts_done' "
+        "WHERE status != 'Completed' AND tts_output IS NOT NULL"
+    )
+
+def downgrade():
+    # SQLite不支持直接删除列
+    with op.batch_alter_table('task') as batch_op:
+        batch_op.drop_column('stage')
@@ -0,0 +1,17 @@
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = '3c4d5e6f7a8b'
+down_revision = '2b3c4d5e6f7a'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # 按任务选择TTS模型, 为空时使用TTS_MODEL_NAME
+    op.add_column('task', sa.Column('tts_model', sa.String(100)))
+
+def downgrade():
+    # SQLite不支持直接删除列
+    with op.batch_alter_table('task') as batch_op:
+        batch_op.drop_column('tts_model')
@@ -0,0 +1,34 @@
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = '4d5e6f7a8b9c'
+down_revision = '3c4d5e6f7a8b'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # 后台训练任务记录
+    op.create_table(
+        'training_job',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('speaker_name', sa.String(100), nullable=False),
+        sa.Column('description', sa.Text()),
+        sa.Column('config', sa.Text()),
+        sa.Column('audio_path', sa.String(300)),
+        sa.Column('status', sa.String(20), default='queued'),
+        sa.Column('progress', sa.Integer(), default=0),
+        sa.Column('message', sa.String(200)),
+        sa.Column('train_dir', sa.String(300)),
+        sa.Column('model_path', sa.String(300)),
+        sa.Column('error_message', sa.Text()),
+        sa.Column('celery_task_id', sa.String(50)),
+        sa.Column('cancel_requested', sa.Boolean(), default=False),
+        sa.Column('created_at', sa.DateTime(), default=sa.func.now()),
+        sa.Column('started_at', sa.DateTime()),
+        sa.Column('finished_at', sa.DateTime()),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+def downgrade():
+    op.drop_table('training_job')
@@ -0,0 +1,578 @@
+import os
+import sys
+import time
+import argparse
+import logging
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+def synthetic_voice(duration: float, sample_rate: int = 44100, seed: int = 0) -> np.ndarray:
+    """生成带颤音和停顿的合成人声信号"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(duration * sample_rate)) / sample_rate
+    f0 = 180 + 40 * np.sin(2 * np.pi * 0.3 * t) + 5 * np.sin(2 * np.pi * 5.5 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / sample_rate
+    voice = sum(np.sin(k * phase) / k for k in range(1, 6))
+    # 每4秒停顿1秒
+    gate = (t % 4.0) < 3.0
+    audio = 0.3 * voice * gate + 0.003 * rng.standard_normal(len(t))
+    return audio.astype(np.float32)
+
+def timed(fn, *args, repeat: int = 1, **kwargs):
+    """多次执行取最短耗时"""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+def bench_f0(args):
+    """分块并行F0提取: 多核扩展性与单次提取的误差"""
+    from app.f0_predictor import compute_f0_chunked, _world_f0
+
+    sample_rate = 44100
+    audio = synthetic_voice(args.duration, sample_rate)
+    frame_period = 1000 * args.hop_length / sample_rate
+
+    reference, base_time = timed(_world_f0, audio, sample_rate, frame_period, args.method)
+    print(f"single-shot {args.method}: {base_time:.2f}s, {len(reference)} frames")
+    print(f"{'workers':>8} {'time(s)':>8} {'speedup':>8} {'vuv_agree':>10} {'p95_cents':>10}")
+
+    max_workers = args.max_workers or os.cpu_count() or 1
+    workers = 1
+    while workers <= max_workers:
+        f0, elapsed = timed(
+            compute_f0_chunked, audio, sample_rate, args.hop_length,
+            method=args.method, num_workers=workers,
+            chunk_seconds=args.chunk_seconds, overlap_seconds=args.overlap_seconds
+        )
+        voiced = (f0 > 0) & (reference > 0)
+        cents = np.abs(1200 * np.log2(f0[voiced] / reference[voiced])) if voiced.any() else np.zeros(1)
+        print(f"{workers:>8} {elapsed:>8.2f} {base_time / elapsed:>8.2f} "
+              f"{np.mean((f0 > 0) == (reference > 0)):>10.4f} {np.percentile(cents, 95):>10.2f}")
+        workers *= 2
+
+def bench_parselmouth(args):
+    """Parselmouth F0: 逐帧查询与整条曲线读取对比"""
+    import parselmouth
+    from app.f0_predictor import F0Predictor
+
+    predictor = F0Predictor('parselmouth')
+    audio = synthetic_voice(args.duration, predictor.sample_rate)
+
+    def per_frame(audio):
+        sound = parselmouth.Sound(audio, predictor.sample_rate)
+        pitch = sound.to_pitch_ac(
+            time_step=predictor.hop_length / predictor.sample_rate,
+            voicing_threshold=0.6,
+            pitch_floor=50.0,
+            pitch_ceiling=1100.0
+        )
+        return np.array([
+            pitch.get_value_at_time(t) if pitch.get_value_at_time(t) is not None
+            else 0.0 for t in pitch.xs()
+        ])
+
+    _, old_time = timed(per_frame, audio, repeat=args.repeat)
+    f0, new_time = timed(predictor.compute_f0, audio, repeat=args.repeat)
+    print(f"per-frame: {old_time:.3f}s, vectorized+aligned: {new_time:.3f}s, "
+          f"speedup {old_time / new_time:.1f}x")
+    print(f"frames: {len(f0)} (dio grid {len(audio) // predictor.hop_length + 1})")
+
+STARTUP_SNIPPETS = {
+    'web': """
+from app import create_app
+from app.utils import setup_svc
+try:
+    setup_svc()
+except RuntimeError as e:
+    print(f"setup_svc skipped: {e}", file=sys.stderr)
+create_app()
+""",
+    'worker': """
+from app import create_app
+create_app()
+from app.worker import init_worker_process
+init_worker_process()
+"""
+}
+
+def bench_startup(args):
+    """Web进程与worker进程的启动耗时和内存"""
+    import subprocess
+
+    for process_type, snippet in STARTUP_SNIPPETS.items():
+        code = (
+            "import sys, time, resource\n"
+            "start = time.perf_counter()\n"
+            + snippet +
+            "elapsed = time.perf_counter() - start\n"
+            "rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024\n"
+            "heavy = [m for m in ('torch', 'TTS', 'librosa', 'fairseq') if m in sys.modules]\n"
+            "print(f'{elapsed:.2f} {rss:.0f} {\",\".join(heavy) or \"-\"}')\n"
+        )
+        timings = []
+        for _ in range(args.repeat):
+            result = subprocess.run(
+                [sys.executable, '-c', code],
+                cwd=BASE_DIR, capture_output=True, text=True
+            )
+            if result.returncode != 0:
+                print(f"{process_type}: failed\n{result.stderr}")
+                break
+            timings.append(result.stdout.strip().splitlines()[-1].split())
+        if timings:
+            best = min(timings, key=lambda row: float(row[0]))
+            print(f"{process_type:>7}: {best[0]}s, peak RSS {best[1]}MB, heavy modules: {best[2]}")
+
+def _sharing_child(model, size_mb, queue):
+    """子进程: 必要时自行加载模型, 推理一次后上报内存"""
+    import torch
+    from app.worker import memory_report
+
+    if model is None:
+        model = _dummy_model(size_mb)
+    with torch.no_grad():
+        model(torch.randn(1, model[0].in_features))
+    queue.put(memory_report())
+
+def _dummy_model(size_mb: float):
+    """按目标大小构造的线性层堆叠, 代替真实模型"""
+    import torch.nn as nn
+
+    width = 1024
+    n_layers = max(1, int(size_mb * 1024 * 1024 / (width * width * 4)))
+    return nn.Sequential(*[nn.Linear(width, width) for _ in range(n_layers)]).eval()
+
+def bench_sharing(args):
+    """prefork子进程模型内存: 各自加载 vs 父进程预加载共享"""
+    import multiprocessing as mp
+    from app.worker import share_module_memory
+
+    ctx = mp.get_context('fork')
+    for mode in ('per-child', 'preload-shared'):
+        model = None
+        if mode == 'preload-shared':
+            model = _dummy_model(args.size_mb)
+            share_module_memory(model)
+
+        queue = ctx.Queue()
+        children = [
+            ctx.Process(target=_sharing_child, args=(model, args.size_mb, queue))
+            for _ in range(args.workers)
+        ]
+        for child in children:
+            child.start()
+        reports = [queue.get() for _ in children]
+        for child in children:
+            child.join()
+
+        print(f"{mode} (model ~{args.size_mb:.0f}MB, {args.workers} workers)")
+        for report in reports:
+            print(f"  pid {report['pid']}: rss {report.get('rss')}MB, "
+                  f"uss {report.get('uss')}MB, pss {report.get('pss')}MB")
+        total_uss = sum(report.get('uss', 0) for report in reports)
+        print(f"  total private memory across children: {total_uss:.1f}MB")
+
+def build_synthesizer(config_path: str):
+    """按配置文件构造随机初始化的SynthesizerTrn"""
+    import json
+    from app.synthesizer import SynthesizerTrn
+
+    with open(config_path) as f:
+        config = json.load(f)
+    model = SynthesizerTrn(
+        spec_channels=config['data'].get('spec_channels', config['data']['filter_length'] // 2 + 1),
+        segment_size=config['train']['segment_size'] // config['data']['hop_length'],
+        **config['model']
+    )
+    return model.eval(), config
+
+def synthesizer_inputs(config, n_frames: int, batch_size: int = 1):
+    """SynthesizerTrn.infer的随机输入(c, f0, g, c_lengths)"""
+    import torch
+
+    c = torch.randn(batch_size, config['model']['ssl_dim'], n_frames)
+    f0 = torch.full((batch_size, n_frames), 220.0)
+    g = torch.zeros(batch_size, dtype=torch.long)
+    c_lengths = torch.full((batch_size,), n_frames, dtype=torch.long)
+    return c, f0, g, c_lengths
+
+def bench_prepare(args):
+    """推理优化: 与未处理模型的一致性和延迟对比"""
+    import torch
+    from app.synthesizer import prepare_for_inference
+
+    baseline, config = build_synthesizer(args.config)
+
+    def clone():
+        # weight_norm模块不支持deepcopy, 通过state_dict复制
+        model, _ = build_synthesizer(args.config)
+        model.load_state_dict(baseline.state_dict())
+        return model
+
+    prepared = prepare_for_inference(clone())
+    inputs = synthesizer_inputs(config, args.frames)
+
+    variants = {
+        'baseline (no_grad)': (baseline, torch.no_grad),
+        'prepared (inference_mode)': (prepared, torch.inference_mode),
+    }
+    if args.trace:
+        traced = prepare_for_inference(clone(), example_inputs=inputs)
+        variants['prepared + traced'] = (traced, torch.inference_mode)
+
+    def run(model, context):
+        torch.manual_seed(0)
+        with context():
+            if isinstance(model, torch.jit.ScriptModule):
+                return model(*inputs)
+            c, f0, g, c_lengths = inputs
+            return model.infer(c, f0, g=g, c_lengths=c_lengths)
+
+    reference = None
+    failed = False
+    for name, (model, context) in variants.items():
+        run(model, context)  # 预热
+        output, elapsed = timed(run, model, context, repeat=args.repeat)
+        if reference is None:
+            reference = output
+        diff = (output - reference).abs().max().item()
+        print(f"{name:>26}: {elapsed * 1000:8.1f}ms, max abs diff {diff:.2e}")
+        if diff > args.tolerance:
+            failed = True
+            print(f"{'':>26}  parity check FAILED (tolerance {args.tolerance})")
+    return 1 if failed else 0
+
+def _state_dict_mb(model) -> float:
+    """序列化后的权重大小(MB)"""
+    import io
+    import torch
+
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell() / 1024 / 1024
+
+def bench_quantize(args):
+    """动态int8量化: 与fp32的速度、权重大小和客观质量对比"""
+    import torch
+    from app.synthesizer import prepare_for_inference
+    from app.quantization import quantize_model, quality_report
+
+    fp32, config = build_synthesizer(args.config)
+    if args.checkpoint:
+        fp32.load_state_dict(torch.load(args.checkpoint, map_location='cpu')['model'])
+    int8, _ = build_synthesizer(args.config)
+    int8.load_state_dict(fp32.state_dict())
+    fp32 = prepare_for_inference(fp32)
+    int8 = quantize_model(prepare_for_inference(int8))
+
+    torch.set_num_threads(args.threads)
+    c, f0, g, c_lengths = synthesizer_inputs(config, args.frames)
+
+    def run(model):
+        torch.manual_seed(0)
+        with torch.inference_mode():
+            return model.infer(c, f0, g=g, c_lengths=c_lengths)[0, 0].numpy()
+
+    outputs = {}
+    for name, model in (('fp32', fp32), ('int8', int8)):
+        run(model)  # 预热
+        outputs[name], elapsed = timed(run, model, repeat=args.repeat)
+        print(f"{name}: {elapsed * 1000:8.1f}ms, weights {_state_dict_mb(model):.1f}MB")
+
+    report = quality_report(outputs['fp32'], outputs['int8'], config['data']['sampling_rate'])
+    print(f"mel distance {report['mel_distance_db']:.3f}dB, "
+          f"F0 RMSE {report['f0_rmse_cents']:.1f} cents, V/UV error {report['vuv_error']:.3f}")
+
+    # 质量门限: 任一指标超出时判定量化失败
+    limits = {
+        'mel_distance_db': args.max_mel_db,
+        'f0_rmse_cents': args.max_f0_cents,
+        'vuv_error': args.max_vuv_error,
+    }
+    failed = [key for key, limit in limits.items() if report[key] > limit]
+    if failed:
+        print("quality check FAILED: " + ", ".join(f"{key} > {limits[key]}" for key in failed))
+        return 1
+    print("quality check ok")
+    return 0
+
+def _conv_workload():
+    """代替解码器的一维卷积堆叠(每项约1秒44.1kHz音频的上采样计算量)"""
+    import torch
+    import torch.nn as nn
+
+    layers = []
+    channels = 256
+    for _ in range(4):
+        layers += [nn.ConvTranspose1d(channels, channels // 2, 16, 8, padding=4), nn.LeakyReLU(0.1)]
+        channels //= 2
+    model = nn.Sequential(*layers).eval()
+    inputs = torch.randn(1, 256, 86)
+    return lambda: model(inputs)
+
+def _placement_child(cores, pin, n_items, queue):
+    """子进程: 按布局绑核后处理固定数量的推理项"""
+    import torch
+    from app.worker import apply_cpu_placement
+
+    if pin:
+        apply_cpu_placement(cores)
+    else:
+        torch.set_num_threads(os.cpu_count() or 1)
+    step = _conv_workload()
+    with torch.inference_mode():
+        step()  # 预热
+        for _ in range(n_items):
+            step()
+    queue.put(n_items)
+
+def bench_placement(args):
+    """CPU布局扫描: 不同(worker数 x 线程数)下的吞吐量"""
+    import multiprocessing as mp
+    from app.worker import available_cores, plan_cpu_layout
+
+    ctx = mp.get_context('fork')
+    cores = available_cores()
+    layouts = []
+    workers = 1
+    while workers <= len(cores):
+        layouts.append((workers, True))
+        workers *= 2
+    # 对照: 2个子进程都使用全部核心且不绑核(默认行为)
+    if len(cores) > 1:
+        layouts.append((2, False))
+
+    print(f"{len(cores)} cores available")
+    print(f"{'workers':>8} {'threads':>8} {'pinned':>7} {'items/s':>9}")
+    results = []
+    for n_workers, pin in layouts:
+        plan = plan_cpu_layout(n_workers, cores)
+        queue = ctx.Queue()
+        start = time.perf_counter()
+        children = [
+            ctx.Process(target=_placement_child, args=(plan[i], pin, args.items, queue))
+            for i in range(n_workers)
+        ]
+        for child in children:
+            child.start()
+        done = sum(queue.get() for _ in children)
+        for child in children:
+            child.join()
+        throughput = done / (time.perf_counter() - start)
+        threads = len(plan[0]) if pin else len(cores)
+        results.append((throughput, n_workers, threads, pin))
+        print(f"{n_workers:>8} {threads:>8} {str(pin):>7} {throughput:>9.2f}")
+
+    best = max(results)
+    print(f"best layout: {best[1]} workers x {best[2]} threads ({best[0]:.2f} items/s)")
+
+def _median_f0(audio: np.ndarray, sample_rate: int) -> float:
+    """浊音帧F0中位数"""
+    from app.f0_predictor import _world_f0
+
+    f0 = _world_f0(audio, sample_rate, 10.0, 'dio')
+    voiced = f0[f0 > 0]
+    return float(np.median(voiced)) if len(voiced) else 0.0
+
+def bench_stretch(args):
+    """语速变体: WSOLA变速与重新合成TTS的耗时对比"""
+    from app.time_stretch import wsola
+
+    sample_rate = 22050
+    rates = [float(r) for r in args.rates.split(',')]
+
+    synthesize = None
+    if args.text:
+        import soundfile as sf
+        from app.utils import generate_tts, cleanup_files
+
+        def synthesize(speed):
+            path = generate_tts(args.text, 1.0, speed)
+            audio, sr = sf.read(path, dtype='float32')
+            cleanup_files(path)
+            return audio, sr
+
+        (base, sample_rate), base_time = timed(synthesize, 1.0)
+    else:
+        base = synthetic_voice(args.duration, sample_rate)
+        base_time = None
+
+    base_f0 = _median_f0(base, sample_rate)
+    print(f"base: {len(base) / sample_rate:.1f}s, median F0 {base_f0:.1f}Hz"
+          + (f", TTS {base_time:.2f}s" if base_time else ''))
+    print(f"{'speed':>6} {'stretch':>10} {'TTS':>8} {'speedup':>8} {'len err':>8} {'F0 shift':>9}")
+    for rate in rates:
+        stretched, stretch_time = timed(wsola, base, rate, sample_rate, repeat=args.repeat)
+        length_error = len(stretched) - round(len(base) / rate)
+        cents = 1200 * np.log2(_median_f0(stretched, sample_rate) / base_f0) if base_f0 else 0.0
+        if synthesize is not None:
+            _, tts_time = timed(synthesize, rate)
+            tts_col = f"{tts_time:>7.2f}s"
+            speedup_col = f"{tts_time / stretch_time:>7.1f}x"
+        else:
+            tts_col = f"{'-':>8}"
+            speedup_col = f"{'-':>8}"
+        print(f"{rate:>6.2f} {stretch_time * 1000:>8.1f}ms {tts_col} {speedup_col} "
+              f"{length_error:>8d} {cents:>7.1f}c")
+
+def bench_preprocess(args):
+    """数据预处理: 不同进程数下prepare_dataset的耗时与加速比"""
+    import shutil
+    import tempfile
+    import soundfile as sf
+    from config import AUDIO_SAMPLE_RATE
+    from app.preprocess import prepare_dataset
+
+    if args.workers:
+        worker_counts = [int(n) for n in args.workers.split(',')]
+    else:
+        worker_counts = []
+        n = 1
+        while n <= (os.cpu_count() or 1):
+            worker_counts.append(n)
+            n *= 2
+
+    work_dir = tempfile.mkdtemp(prefix='bench_preprocess_')
+    try:
+        audio_path = os.path.join(work_dir, 'input.wav')
+        sf.write(audio_path, synthetic_voice(args.duration, AUDIO_SAMPLE_RATE), AUDIO_SAMPLE_RATE)
+
+        # 预热(librosa首次调用有JIT编译开销, fork出的子进程会继承)
+        prepare_dataset(audio_path, os.path.join(work_dir, 'warmup'), num_workers=1)
+
+        print(f"{os.cpu_count()} cores, {args.duration:.0f}s input")
+        print(f"{'workers':>8} {'time':>8} {'speedup':>8} {'segments':>9}")
+        baseline = None
+        for n in worker_counts:
+            output_dir = os.path.join(work_dir, f'out_{n}')
+            ok, elapsed = timed(prepare_dataset, audio_path, output_dir, num_workers=n)
+            if not ok:
+                print(f"{n:>8} failed")
+                continue
+            segments = len([d for d in os.listdir(output_dir) if d.startswith('segment_')])
+            baseline = baseline or elapsed
+            print(f"{n:>8} {elapsed:>7.2f}s {baseline / elapsed:>7.2f}x {segments:>9}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def bench_spectral(args):
+    """频谱前端: 与librosa的mel一致性及单条/批量耗时"""
+    import librosa
+    import torch
+    from config import AUDIO_SAMPLE_RATE, SPECTRAL_CONFIG
+    from app.spectral import log_mel_spectrogram
+
+    audios = [synthetic_voice(args.duration, AUDIO_SAMPLE_RATE, seed=i) for i in range(args.batch_size)]
+
+    def reference(audio):
+        # 基线预处理的librosa参数(不居中分帧)
+        mel = librosa.feature.melspectrogram(
+            y=audio, sr=AUDIO_SAMPLE_RATE, n_fft=SPECTRAL_CONFIG['n_fft'],
+            hop_length=SPECTRAL_CONFIG['hop_length'], win_length=SPECTRAL_CONFIG['win_length'],
+            n_mels=SPECTRAL_CONFIG['n_mels'], fmin=SPECTRAL_CONFIG['fmin'], fmax=SPECTRAL_CONFIG['fmax'],
+            center=False
+        )
+        return librosa.power_to_db(mel, ref=1.0, top_db=80.0)
+
+    expected, librosa_time = timed(lambda: [reference(a) for a in audios], repeat=args.repeat)
+    _, single_time = timed(lambda: [log_mel_spectrogram(a) for a in audios], repeat=args.repeat)
+    batch = torch.from_numpy(np.stack(audios))
+    actual, batch_time = timed(log_mel_spectrogram, batch, repeat=args.repeat)
+
+    # 帧数不同(分帧方式不一致)也视为不一致
+    matched = all(e.shape == a.shape for e, a in zip(expected, actual))
+    error = max(float(np.max(np.abs(e - a.numpy()))) for e, a in zip(expected, actual)) if matched else float('inf')
+    print(f"{args.batch_size} x {args.duration:.0f}s, max abs diff {error:.2e} dB "
+          f"({'ok' if error <= args.tolerance else 'MISMATCH'})")
+    print(f"librosa {librosa_time * 1000:.1f}ms, torch {single_time * 1000:.1f}ms, "
+          f"torch batched {batch_time * 1000:.1f}ms ({librosa_time / batch_time:.1f}x)")
+    return 0 if error <= args.tolerance else 1
+
+def main():
+    parser = argparse.ArgumentParser(description='性能基准测试')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    f0_parser = subparsers.add_parser('f0', help='分块并行F0提取')
+    f0_parser.add_argument('--duration', type=float, default=300.0)
+    f0_parser.add_argument('--method', choices=['dio', 'harvest'], default='harvest')
+    f0_parser.add_argument('--hop-length', type=float, default=512)
+    f0_parser.add_argument('--chunk-seconds', type=float, default=20.0)
+    f0_parser.add_argument('--overlap-seconds', type=float, default=1.0)
+    f0_parser.add_argument('--max-workers', type=int, default=None)
+    f0_parser.set_defaults(func=bench_f0)
+
+    pm_parser = subparsers.add_parser('parselmouth', help='向量化Parselmouth F0')
+    pm_parser.add_argument('--duration', type=float, default=60.0)
+    pm_parser.add_argument('--repeat', type=int, default=3)
+    pm_parser.set_defaults(func=bench_parselmouth)
+
+    startup_parser = subparsers.add_parser('startup', help='进程启动耗时')
+    startup_parser.add_argument('--repeat', type=int, default=3)
+    startup_parser.set_defaults(func=bench_startup)
+
+    sharing_parser = subparsers.add_parser('sharing', help='prefork子进程模型内存共享')
+    sharing_parser.add_argument('--workers', type=int, default=2)
+    sharing_parser.add_argument('--size-mb', type=float, default=200.0)
+    sharing_parser.set_defaults(func=bench_sharing)
+
+    prepare_parser = subparsers.add_parser('prepare', help='SynthesizerTrn推理优化')
+    prepare_parser.add_argument('--config', default=os.path.join(BASE_DIR, 'config', 'model_config.json'))
+    prepare_parser.add_argument('--frames', type=int, default=400)
+    prepare_parser.add_argument('--repeat', type=int, default=5)
+    prepare_parser.add_argument('--tolerance', type=float, default=1e-4)
+    prepare_parser.add_argument('--trace', action='store_true')
+    prepare_parser.set_defaults(func=bench_prepare)
+
+    quantize_parser = subparsers.add_parser('quantize', help='动态int8量化')
+    quantize_parser.add_argument('--config', default=os.path.join(BASE_DIR, 'config', 'model_config.json'))
+    quantize_parser.add_argument('--checkpoint', default=None, help='训练好的G_*.pth, 不指定则用随机权重')
+    quantize_parser.add_argument('--frames', type=int, default=400)
+    quantize_parser.add_argument('--repeat', type=int, default=5)
+    quantize_parser.add_argument('--threads', type=int, default=os.cpu_count() or 1)
+    quantize_parser.add_argument('--max-mel-db', type=float, default=1.0, help='允许的最大log-mel距离(dB)')
+    quantize_parser.add_argument('--max-f0-cents', type=float, default=50.0, help='允许的最大F0 RMSE(音分)')
+    quantize_parser.add_argument('--max-vuv-error', type=float, default=0.05, help='允许的最大清浊音判定差异比例')
+    quantize_parser.set_defaults(func=bench_quantize)
+
+    placement_parser = subparsers.add_parser('placement', help='worker数与torch线程数扫描')
+    placement_parser.add_argument('--items', type=int, default=20, help='每个worker处理的推理项数')
+    placement_parser.set_defaults(func=bench_placement)
+
+    stretch_parser = subparsers.add_parser('stretch', help='语速变体WSOLA变速')
+    stretch_parser.add_argument('--rates', default='0.8,0.9,1.1,1.25')
+    stretch_parser.add_argument('--duration', type=float, default=10.0)
+    stretch_parser.add_argument('--text', default=None, help='指定文本时与真实TTS重新合成对比')
+    stretch_parser.add_argument('--repeat', type=int, default=3)
+    stretch_parser.set_defaults(func=bench_stretch)
+
+    preprocess_parser = subparsers.add_parser('preprocess', help='并行数据预处理扩展性')
+    preprocess_parser.add_argument('--duration', type=float, default=120.0)
+    preprocess_parser.add_argument('--workers', default=None, help='逗号分隔的进程数, 默认1,2,4..CPU数')
+    preprocess_parser.set_defaults(func=bench_preprocess)
+
+    spectral_parser = subparsers.add_parser('spectral', help='torch频谱前端与librosa对比')
+    spectral_parser.add_argument('--duration', type=float, default=5.0)
+    spectral_parser.add_argument('--batch-size', type=int, default=16)
+    spectral_parser.add_argument('--repeat', type=int, default=3)
+    spectral_parser.add_argument('--tolerance', type=float, default=1e-2, help='允许的最大dB误差')
+    spectral_parser.set_defaults(func=bench_spectral)
+
+    args = parser.parse_args()
+    # 一致性检查失败时返回非0
+    sys.exit(args.func(args))
+
+if __name__ == '__main__':
+    main()
@@ -167,6 +167,9 @@ start_services() {
     # 启动Celery worker
     ./scripts/start_celery.sh &
     
+    # 启动训练worker(training队列)
+    ./scripts/start_training_worker.sh &
+    
     # 启动Flask应用
     ./scripts/start_app.sh &
     
@@ -182,6 +185,10 @@ start_services() {
         error "Celery服务启动失败"
     fi
     
+    if ! celery -A app.celery inspect ping -d "training@$(hostname)" &> /dev/null; then
+        error "Celery训练worker启动失败"
+    fi
+    
     log "所有服务已启动"
     log "访问 http://localhost:5000 使用系统"
 }
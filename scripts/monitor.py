@@ -146,7 +146,8 @@ class SystemMonitor:
         self.services = {
             'flask': {'port': 5000, 'url': 'http://localhost:5000/'},
             'redis': {'port': 6379},
-            'celery': {'process': 'celery'}
+            'celery': {'process': 'default@'},
+            'celery_training': {'process': 'training@'}
         }
         self.service_manager = ServiceManager()
         self.alert_manager = AlertManager()
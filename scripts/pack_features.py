@@ -0,0 +1,32 @@
+import os
+import sys
+import argparse
+import logging
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from app.feature_store import convert_segment_dirs
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+def main():
+    parser = argparse.ArgumentParser(description='把segment_XXXX目录转换为打包特征格式')
+    parser.add_argument('dataset_dirs', nargs='+', help='预处理输出目录(含train.txt)')
+    parser.add_argument('--shard-size', type=int, default=None, help='每个分片的片段数')
+    args = parser.parse_args()
+
+    for dataset_dir in args.dataset_dirs:
+        try:
+            convert_segment_dirs(dataset_dir, shard_size=args.shard_size)
+        except Exception as e:
+            logger.error(f"Failed to pack {dataset_dir}: {str(e)}")
+
+if __name__ == '__main__':
+    main()
@@ -98,8 +98,18 @@ class ServiceDependencyManager:
             elif service == 'celery':
                 subprocess.Popen([
                     'celery', '-A', 'app.celery', 'worker',
+                    '-n', 'default@%h',
                     '--loglevel=info', '--pool=solo'
                 ])
+            elif service == 'celery_training':
+                # 训练worker只消费training队列, 不预加载推理模型
+                subprocess.Popen([
+                    'celery', '-A', 'app.celery', 'worker',
+                    '-Q', os.getenv('TRAINING_QUEUE', 'training'),
+                    '-n', 'training@%h',
+                    '--concurrency=1', '--prefetch-multiplier=1',
+                    '--loglevel=info'
+                ], env=dict(os.environ, TTS_POOL_WARM='false', SVC_PRELOAD_MODELS='false'))
             elif service == 'flask':
                 subprocess.Popen(['python', 'run.py'])
                 
@@ -127,7 +137,8 @@ class ServiceDependencyManager:
                 # 查找并终止进程
                 for proc in psutil.process_iter(['name', 'cmdline']):
                     cmdline = str(proc.info['cmdline'])
-                    if (service == 'celery' and 'celery worker' in cmdline) or \
+                    if (service == 'celery' and 'default@' in cmdline) or \
+                       (service == 'celery_training' and 'training@' in cmdline) or \
                        (service == 'flask' and 'python run.py' in cmdline):
                         proc.terminate()
                         proc.wait(timeout=5)
@@ -56,10 +56,20 @@ start_all() {
         sleep 2
     fi
     
-    # 启动Celery
-    if ! check_process "celery"; then
+    # 启动Celery(合成任务)
+    if ! check_process "default@"; then
         log "Starting Celery..."
-        celery -A app.celery worker --loglevel=info --detach
+        celery -A app.celery worker -n default@%h --loglevel=info --detach
+        sleep 2
+    fi
+    
+    # 启动训练worker(只消费training队列, 一次一个训练任务)
+    if ! check_process "training@"; then
+        log "Starting Celery training worker..."
+        TTS_POOL_WARM=false SVC_PRELOAD_MODELS=false \
+        celery -A app.celery worker -Q "${TRAINING_QUEUE:-training}" -n training@%h \
+            --concurrency=1 --prefetch-multiplier=1 \
+            --loglevel=info --logfile=logs/celery_training.log --detach
         sleep 2
     fi
     
@@ -78,11 +88,16 @@ start_all() {
         all_running=false
     fi
     
-    if ! check_process "celery"; then
+    if ! check_process "default@"; then
         error "Celery failed to start"
         all_running=false
     fi
     
+    if ! check_process "training@"; then
+        error "Celery training worker failed to start"
+        all_running=false
+    fi
+    
     if ! check_service "Flask" 5000; then
         error "Flask failed to start"
         all_running=false
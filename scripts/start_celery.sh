@@ -8,6 +8,7 @@ source venv/bin/activate
 
 # 启动Celery worker
 celery -A app.celery worker \
+    -n default@%h \
     --loglevel=info \
     --concurrency=2 \
     --pool=prefork \
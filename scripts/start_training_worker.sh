@@ -0,0 +1,19 @@
+#!/bin/bash
+
+# 确保在项目根目录
+cd "$(dirname "$0")/.."
+
+# 激活虚拟环境（如果使用）
+source venv/bin/activate
+
+# 启动训练worker: 只消费training队列, 一次执行一个训练任务, 不预取
+# 训练worker不做推理, 不预加载TTS/SVC模型
+TTS_POOL_WARM=false SVC_PRELOAD_MODELS=false \
+celery -A app.celery worker \
+    -Q "${TRAINING_QUEUE:-training}" \
+    -n training@%h \
+    --loglevel=info \
+    --concurrency=1 \
+    --prefetch-multiplier=1 \
+    --pool=prefork \
+    --logfile=logs/celery_training.log